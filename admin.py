@@ -1,5 +1,153 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.template.response import TemplateResponse
+from django.utils.translation import ugettext_lazy as _
+from datetime import timedelta
+from .caching import cached_authors
 from .models import Tag, Post, Page
+from . import search
+
+
+class GinyuChangeList(ChangeList):
+    """
+    Loads only the `list_only` columns of the model admin, and answers
+    the search box from the full-text index instead of LIKE lookups on
+    every search field.
+
+    """
+    def get_query_set(self, request):
+        query, self.query = self.query, ''
+        try:
+            queryset = super(GinyuChangeList, self).get_query_set(request)
+        finally:
+            self.query = query
+        if query:
+            queryset = search.filter_queryset(queryset, query)
+        if self.model_admin.list_only:
+            queryset = queryset.only(*self.model_admin.list_only)
+        return queryset
+
+
+class AuthorFilter(admin.SimpleListFilter):
+    """Filters by author, listing only users who wrote something."""
+    title = _('author')
+    parameter_name = 'author'
+
+    def lookups(self, request, model_admin):
+        return cached_authors(model_admin.model)
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(author=self.value())
+        return queryset
+
+
+class ShiftForm(forms.Form):
+    days = forms.IntegerField(initial=1,
+                              help_text='Negative values move them back.')
+    hours = forms.IntegerField(initial=0)
+
+
+class TagForm(forms.Form):
+    tag = forms.ModelChoiceField(Tag.objects.all())
+
+
+def action_form(modeladmin, request, queryset, form_class, title):
+    """
+    Returns the valid form of an action that asks for input, or the page
+    asking for it.
+
+    """
+    if 'apply' in request.POST:
+        form = form_class(request.POST)
+        if form.is_valid():
+            return form
+    else:
+        form = form_class()
+    return TemplateResponse(request, 'admin/ginyu/bulk_action.html', {
+        'title': title,
+        'form': form,
+        'queryset': queryset,
+        'opts': modeladmin.model._meta,
+        'action': request.POST['action'],
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    }, current_app=modeladmin.admin_site.name)
+
+
+def selected(queryset):
+    return list(queryset.values_list('pk', flat=True))
+
+
+# The actions below update every selected row at once, see
+# PostManager.change_in_bulk, instead of saving them one by one.
+
+def publish_now(modeladmin, request, queryset):
+    count = modeladmin.model.objects.publish_now(selected(queryset))
+    modeladmin.message_user(request, 'Published %d row(s).' % count)
+publish_now.short_description = 'Publish selected %(verbose_name_plural)s now'
+
+
+def make_draft(modeladmin, request, queryset):
+    count = modeladmin.model.objects.make_draft(selected(queryset))
+    modeladmin.message_user(request, 'Moved %d row(s) to drafts.' % count)
+make_draft.short_description = 'Make selected %(verbose_name_plural)s drafts'
+
+
+def shift_publish_date(modeladmin, request, queryset):
+    form = action_form(modeladmin, request, queryset, ShiftForm,
+                       'Shift the publish date')
+    if not isinstance(form, ShiftForm):
+        return form
+    delta = timedelta(days=form.cleaned_data['days'],
+                      hours=form.cleaned_data['hours'])
+    count = modeladmin.model.objects.shift_publish_date(selected(queryset),
+                                                        delta)
+    modeladmin.message_user(request, 'Rescheduled %d row(s).' % count)
+shift_publish_date.short_description = ('Shift the publish date of selected '
+                                        '%(verbose_name_plural)s')
+
+
+def add_tag(modeladmin, request, queryset, remove=False):
+    form = action_form(modeladmin, request, queryset, TagForm,
+                       'Remove a tag' if remove else 'Add a tag')
+    if not isinstance(form, TagForm):
+        return form
+    tag = form.cleaned_data['tag']
+    count = Post.objects.tag_in_bulk(selected(queryset), tag, remove=remove)
+    modeladmin.message_user(request, '%s %s %d post(s).' % (
+        'Removed' if remove else 'Added', tag, count))
+add_tag.short_description = 'Add a tag to selected posts'
+
+
+def remove_tag(modeladmin, request, queryset):
+    return add_tag(modeladmin, request, queryset, remove=True)
+remove_tag.short_description = 'Remove a tag from selected posts'
+
+
+class ChangeListMixin(object):
+    """
+    Shared changelist setup of PostAdmin and PageAdmin. Rows are saved
+    from the changelist with only their edited columns, so toggling
+    draft_mode does not render anything.
+
+    """
+    # the columns shown, and those the save receivers look at
+    list_only = ('title', 'slug', 'publish_date', 'draft_mode',
+                 'render_pending', 'modified')
+    actions = [publish_now, make_draft, shift_publish_date]
+
+    def get_changelist(self, request, **kwargs):
+        return GinyuChangeList
+
+    def is_list_edit(self, form):
+        # changelist forms also carry the pk of their row
+        editable = set(self.list_editable) | set([self.model._meta.pk.name])
+        return set(form.fields) <= editable
+
+    def save_list_edit(self, obj, form):
+        obj.save(update_fields=form.changed_data)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -7,15 +155,16 @@ class TagAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
 
     def post_count(self, obj):
-        """counts the number of post-relationships for each tag"""
-        return obj.post_set.count()
+        """the number of active posts with each tag"""
+        return obj.active_post_count
     post_count.short_description = '# of posts tagged'
+    post_count.admin_order_field = 'active_post_count'
 
 
-class PostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'publish_date', 'draft_mode')
+class PostAdmin(ChangeListMixin, admin.ModelAdmin):
+    list_display = ('title', 'publish_date', 'draft_mode', 'render_pending')
     list_editable = ['draft_mode']
-    list_filter = ('author', 'draft_mode', 'publish_date')
+    list_filter = (AuthorFilter, 'draft_mode', 'publish_date', 'render_pending')
     list_per_page = 25
     search_fields = ('title', 'description', 'content')
     date_hierarchy = 'publish_date'
@@ -38,6 +187,8 @@ class PostAdmin(admin.ModelAdmin):
 
     filter_horizontal = ('tags',)
     prepopulated_fields = {'slug': ('title',)}
+    list_only = ChangeListMixin.list_only + ('previous_post', 'next_post')
+    actions = ChangeListMixin.actions + [add_tag, remove_tag]
 
     def tag_count(self, obj):
         return str(obj.tags.count())
@@ -49,13 +200,15 @@ class PostAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         """Set the post's author based on the logged in user"""
+        if change and self.is_list_edit(form):
+            return self.save_list_edit(obj, form)
         obj.author = request.user
         obj.save()
 
-class PageAdmin(admin.ModelAdmin):
-    list_display = ('title', 'publish_date', 'draft_mode')
+class PageAdmin(ChangeListMixin, admin.ModelAdmin):
+    list_display = ('title', 'publish_date', 'draft_mode', 'render_pending')
     list_editable = ['draft_mode']
-    list_filter = ('author', 'draft_mode', 'publish_date')
+    list_filter = (AuthorFilter, 'draft_mode', 'publish_date', 'render_pending')
     list_per_page = 25
     search_fields = ('title', 'description', 'content')
     date_hierarchy = 'publish_date'
@@ -87,6 +240,8 @@ class PageAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         """Set the Page's author based on the logged in user"""
+        if change and self.is_list_edit(form):
+            return self.save_list_edit(obj, form)
         obj.author = request.user
         obj.save()
 
@@ -0,0 +1,95 @@
+"""
+Benchmarks for Ginyu.
+
+Each module is run as a script with the project's settings, e.g.
+
+    DJANGO_SETTINGS_MODULE=mysite.settings python -m mysite.ginyu.benchmarks.indexes
+
+They create a throw-away test database through the South migrations,
+since some of the indexes they measure are only created there, fill it
+with synthetic posts and print their timings. The real database is
+never touched.
+
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from datetime import timedelta
+import random
+import time
+
+WORDS = ('ginyu force markdown django python render cache index query '
+         'post page tag archive feed search skate ninja code music').split()
+
+
+def setup_database():
+    """Creates the test database and returns the old database name."""
+    setup_test_environment()
+    if 'south' in settings.INSTALLED_APPS:
+        # South's syncdb skips migrated apps unless told to migrate them
+        from south.management.commands import patch_for_test_db_setup
+        settings.SOUTH_TESTS_MIGRATE = True
+        patch_for_test_db_setup()
+    return connection.creation.create_test_db(verbosity=0)
+
+
+def teardown_database(old_name):
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def sentence(count):
+    return ' '.join(random.choice(WORDS) for i in range(count))
+
+
+def make_posts(count, batch_size=1000, seed=0):
+    """
+    Bulk creates `count` posts spread over ten years. About 10% are
+    drafts and 2% are scheduled in the future. save() is bypassed, so
+    nothing is rendered.
+
+    """
+    from ..models import Post
+
+    random.seed(seed)
+    author, _ = User.objects.get_or_create(username='benchmark')
+    now = timezone.now()
+    posts = []
+    for i in range(count):
+        content = sentence(200)
+        date = now - timedelta(minutes=random.randint(0, 60 * 24 * 365 * 10))
+        if random.random() < 0.02:
+            date = now + timedelta(days=random.randint(1, 30))
+        posts.append(Post(
+            title=sentence(6), slug='post-%d' % i, author=author,
+            content=content, rendered_content='<p>%s</p>' % content,
+            excerpt=content[:200], rendered_excerpt=content[:200],
+            description=content[:100], publish_date=date,
+            draft_mode=random.random() < 0.1))
+        if len(posts) == batch_size:
+            Post.objects.bulk_create(posts)
+            posts = []
+    Post.objects.bulk_create(posts)
+
+
+def timed(func, repeat=20):
+    """Returns the best and median time of `func` in milliseconds."""
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append((time.time() - start) * 1000)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def explain(queryset):
+    """Returns the database's query plan for `queryset` as text."""
+    sql, params = queryset.query.sql_with_params()
+    prefix = {'sqlite': 'EXPLAIN QUERY PLAN ',
+              'postgresql': 'EXPLAIN ANALYZE '}.get(connection.vendor, 'EXPLAIN ')
+    cursor = connection.cursor()
+    cursor.execute(prefix + sql, params)
+    return '\n'.join(' '.join(str(c) for c in row) for row in cursor.fetchall())
@@ -0,0 +1,98 @@
+"""
+Compares the Post changelist of PostAdmin with a plain ModelAdmin set up
+the way PostAdmin used to be, over 50k posts: the queries and latency of
+the first page, a filtered and a searched page, and the cost of a
+draft_mode toggle from the changelist. The project's urls must include
+the admin.
+
+"""
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.client import RequestFactory
+
+from . import make_posts, setup_database, teardown_database, timed
+
+POSTS = 50000
+
+
+class PlainPostAdmin(admin.ModelAdmin):
+    """PostAdmin's changelist before it was trimmed."""
+    list_display = ('title', 'publish_date', 'draft_mode', 'render_pending')
+    list_editable = ['draft_mode']
+    list_filter = ('author', 'draft_mode', 'publish_date', 'render_pending')
+    list_per_page = 25
+    search_fields = ('title', 'description', 'content')
+    date_hierarchy = 'publish_date'
+
+
+def changelist(model_admin, user, params):
+    request = RequestFactory().get('/admin/ginyu/post/', params)
+    request.user = user
+    response = model_admin.changelist_view(request)
+    response.render()
+    return response
+
+
+def queries(func):
+    """Returns the number of queries `func` makes."""
+    use_debug_cursor = connection.use_debug_cursor
+    connection.use_debug_cursor = True
+    start = len(connection.queries)
+    try:
+        func()
+        return len(connection.queries) - start
+    finally:
+        connection.use_debug_cursor = use_debug_cursor
+
+
+def main():
+    from ..models import Post
+
+    old_name = setup_database()
+    try:
+        make_posts(POSTS)
+        call_command('ginyu_reindex', verbosity=0)
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        for i in range(200):
+            User.objects.create_user('user-%d' % i, 'user%d@example.com' % i)
+        author = User.objects.get(username='benchmark')
+
+        plain, trimmed = PlainPostAdmin(Post, admin.site), admin.site._registry[Post]
+        # (page, plain params, PostAdmin params)
+        pages = [('first page', {}, {}),
+                 ('by author', {'author__id__exact': author.pk},
+                  {'author': author.pk}),
+                 ('search', {'q': 'skate ninja'}, {'q': 'skate ninja'})]
+        for page, plain_params, params in pages:
+            print('== %s' % page)
+            for name, model_admin, params in (('plain', plain, plain_params),
+                                              ('PostAdmin', trimmed, params)):
+                view = lambda: changelist(model_admin, user, params)
+                count = queries(view)
+                best, median = timed(view, repeat=5)
+                print('%-10s %3d queries  best %8.2fms  median %8.2fms' % (
+                    name, count, best, median))
+
+        print('== draft_mode toggle')
+        for name, only in (('full row', None),
+                           ('changelist row', admin.site._registry[Post].list_only)):
+            def toggle():
+                posts = Post.objects.all()
+                post = (posts.only(*only) if only else posts)[0]
+                post.draft_mode = not post.draft_mode
+                if only:
+                    post.save(update_fields=['draft_mode', 'modified'])
+                else:
+                    post.save()
+            count = queries(toggle)
+            best, median = timed(toggle, repeat=5)
+            print('%-14s %3d queries  best %8.2fms  median %8.2fms' % (
+                name, count, best, median))
+    finally:
+        teardown_database(old_name)
+
+
+if __name__ == '__main__':
+    main()
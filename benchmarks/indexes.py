@@ -0,0 +1,52 @@
+"""
+Compares query plans and latency of the PostManager.active() query shapes
+with and without the indexes added in migration 0013.
+
+"""
+from django.utils.importlib import import_module
+
+from . import explain, make_posts, setup_database, teardown_database, timed
+
+MIGRATION = '0013_auto__add_index_post_draft_mode_publish_date'
+POSTS = 100000
+
+
+def queries():
+    from ..models import Post
+
+    return [
+        ('active, first page', lambda: Post.objects.active()[:10]),
+        ('active, keyset page', lambda: Post.objects.active().order_by(
+            '-publish_date', '-pk')[:10]),
+        ('year archive', lambda: Post.objects.active().filter(
+            publish_date__year=2012)[:20]),
+        ('detail by year and slug', lambda: Post.objects.filter(
+            publish_date__year=2012, slug='post-5000')),
+    ]
+
+
+def report(title):
+    print('== %s' % title)
+    for name, queryset in queries():
+        best, median = timed(lambda: list(queryset()))
+        print('%-26s best %8.2fms  median %8.2fms' % (name, best, median))
+        print('    ' + explain(queryset()).replace('\n', '\n    '))
+
+
+def main():
+    app = __name__.rsplit('.', 2)[0]
+    migration = import_module('%s.migrations.%s' % (app, MIGRATION)).Migration()
+
+    old_name = setup_database()
+    try:
+        make_posts(POSTS)
+        migration.backwards(None)
+        report('without indexes (%d posts)' % POSTS)
+        migration.forwards(None)
+        report('with indexes (%d posts)' % POSTS)
+    finally:
+        teardown_database(old_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares the admin's LIKE search with the full-text index over 100k
+posts, and times building the index.
+
+"""
+from django.core.management import call_command
+from django.db.models import Q
+
+from . import explain, make_posts, setup_database, teardown_database, timed
+import time
+
+POSTS = 100000
+
+QUERIES = ('ninja', 'render cache', 'skate ninja music')
+
+
+def like(query):
+    """The queryset the admin builds from PostAdmin.search_fields."""
+    from ..models import Post
+
+    queryset = Post.objects.all()
+    for word in query.split():
+        queryset = queryset.filter(Q(title__icontains=word) |
+                                   Q(description__icontains=word) |
+                                   Q(content__icontains=word))
+    return queryset
+
+
+def main():
+    from ..models import Post
+    from ..search import filter_queryset, matching
+
+    old_name = setup_database()
+    try:
+        make_posts(POSTS)
+        start = time.time()
+        call_command('ginyu_reindex', verbosity=0)
+        print('indexed %d posts in %.1fs' % (POSTS, time.time() - start))
+
+        for query in QUERIES:
+            print('== %r' % query)
+            shapes = [
+                ('LIKE scan', lambda: like(query)[:25]),
+                ('admin, indexed', lambda: filter_queryset(
+                    Post.objects.all(), query)[:25]),
+                ('public, ranked', lambda: matching(query)[:10]),
+            ]
+            for name, queryset in shapes:
+                best, median = timed(lambda: list(queryset()), repeat=5)
+                print('%-16s best %8.2fms  median %8.2fms' % (name, best, median))
+                print('    ' + explain(queryset()).replace('\n', '\n    '))
+    finally:
+        teardown_database(old_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+"""
+Cached data shared by Ginyu views and context processors.
+
+Everything here is stored in the default cache and invalidated by the
+signal receivers connected in `models`, through `events`.
+
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import available_attrs
+from django.utils.encoding import force_bytes
+from django.views.decorators.http import condition
+
+from calendar import timegm
+from functools import wraps
+import hashlib
+import uuid
+
+from . import events
+from .metrics import count_cache
+
+TAG_LIST_KEY = 'ginyu:tag_list:%s'
+GROUP_KEY = 'ginyu:group:%s'
+PAGE_KEY = 'ginyu:page:%s'
+COUNT_KEY = 'ginyu:count:%s:%s'
+ACTIVE_KEY = 'ginyu:active:%s'
+FEED_KEY = 'ginyu:feed:%s:%s'
+AUTHORS_KEY = 'ginyu:authors:%s:%s'
+GROUP_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def timeout_until_next_publish(default):
+    """
+    Returns `default` seconds, shortened so the entry expires when the
+    next scheduled post goes live, i.e. at the first GINYU_ACTIVE_BUCKET
+    boundary after its publish_date.
+
+    """
+    from .models import Post
+
+    next_date = Post.objects.next_publish_date()
+    if next_date is None:
+        return default
+    seconds = int((next_date - timezone.now()).total_seconds()) + 1
+    bucket = getattr(settings, 'GINYU_ACTIVE_BUCKET', 0)
+    if bucket:
+        seconds += -timegm(next_date.utctimetuple()) % bucket
+    return max(1, min(default, seconds))
+
+
+def tag_list_key():
+    return TAG_LIST_KEY % getattr(settings, 'SITE_ID', 1)
+
+
+def get_tag_list():
+    """
+    Returns the tags that have active posts, each annotated with
+    `post_count`. `GINYU_TAG_CLOUD_SIZE` limits the list to the most
+    used tags.
+
+    """
+    from .models import Tag, active_now
+
+    tags = cache.get(tag_list_key())
+    count_cache('tag_list', tags is not None)
+    if tags is None:
+        now = active_now()
+        queryset = Tag.objects.filter(
+            post__draft_mode=False, post__publish_date__lte=now).annotate(
+            post_count=Count('post'))
+        size = getattr(settings, 'GINYU_TAG_CLOUD_SIZE', None)
+        if size:
+            queryset = queryset.order_by('-post_count', 'name')[:size]
+        tags = sorted(queryset, key=lambda tag: tag.name)
+        timeout = getattr(settings, 'GINYU_TAG_CACHE_TIMEOUT', 60 * 60)
+        cache.set(tag_list_key(), tags, timeout_until_next_publish(timeout))
+    return tags
+
+
+def invalidate_tag_list(**kwargs):
+    cache.delete(tag_list_key())
+
+
+def tag_list_changed(**kwargs):
+    """Receiver for changes to posts, tags and their relation."""
+    events.emit('tag_list')
+
+
+class LazyTagList(object):
+    """
+    A tag list that is only loaded when a template uses it.
+
+    """
+    def __init__(self):
+        self._tags = None
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            self._tags = get_tag_list()
+        return self._tags
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __getitem__(self, index):
+        return self.tags[index]
+
+    def __bool__(self):
+        return bool(self.tags)
+    __nonzero__ = __bool__
+
+
+# Page cache
+#
+# Rendered responses are stored under a key made from the request path
+# and the current generation of every group the page belongs to, e.g.
+# 'list', 'year:2013' or 'post:2013/my-slug'. Invalidating a group gives
+# it a new generation, so only the pages in that group are missed.
+
+def page_cache_enabled():
+    return getattr(settings, 'GINYU_PAGE_CACHE', False)
+
+
+def get_generations(groups):
+    keys = [GROUP_KEY % g for g in groups]
+    generations = cache.get_many(keys)
+    missing = dict((k, uuid.uuid4().hex) for k in keys if k not in generations)
+    if missing:
+        cache.set_many(missing, GROUP_TIMEOUT)
+        generations.update(missing)
+    return [generations[k] for k in keys]
+
+
+def invalidate_pages(*groups):
+    """Drop every cached page in the given groups."""
+    cache.set_many(dict((GROUP_KEY % g, uuid.uuid4().hex) for g in groups),
+                   GROUP_TIMEOUT)
+
+
+def page_key(request, groups):
+    bits = [request.get_full_path()] + get_generations(groups)
+    return PAGE_KEY % hashlib.md5(force_bytes('|'.join(bits))).hexdigest()
+
+
+def is_cacheable(request):
+    user = getattr(request, 'user', None)
+    return (page_cache_enabled() and request.method in ('GET', 'HEAD') and
+            not (user is not None and user.is_authenticated()))
+
+
+def cached_response(request, groups, render):
+    """
+    Returns the cached response for `request`, or calls `render` and
+    caches its result until one of `groups` is invalidated or the next
+    scheduled post goes live.
+
+    """
+    if not is_cacheable(request):
+        return render()
+
+    key = page_key(request, groups)
+    cached = cache.get(key)
+    count_cache('page', cached is not None)
+    if cached is not None:
+        status, content_type, content = cached
+        return HttpResponse(content, content_type=content_type, status=status)
+
+    response = render()
+    if response.status_code == 200 and not response.streaming:
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        timeout = getattr(settings, 'GINYU_PAGE_CACHE_TIMEOUT', 60 * 10)
+        cache.set(key, (response.status_code, response['Content-Type'],
+                        response.content),
+                  timeout_until_next_publish(timeout))
+    return response
+
+
+def cached_count(queryset, group):
+    """
+    Returns `queryset.count()`, cached until the page cache group `group`
+    is invalidated or the next scheduled post goes live.
+
+    """
+    key = COUNT_KEY % (group, get_generations([group])[0])
+    count = cache.get(key)
+    count_cache('count', count is not None)
+    if count is None:
+        count = queryset.count()
+        timeout = getattr(settings, 'GINYU_COUNT_CACHE_TIMEOUT', 60 * 60)
+        cache.set(key, count, timeout_until_next_publish(timeout))
+    return count
+
+
+def cached_authors(model):
+    """
+    Returns the (id, name) pairs of the users who wrote a `model` object,
+    for admin filters. Cached until the 'authors' group is invalidated.
+
+    """
+    from django.contrib.auth.models import User
+
+    name = model._meta.object_name.lower()
+    key = AUTHORS_KEY % (name, get_generations(['authors'])[0])
+    authors = cache.get(key)
+    count_cache('authors', authors is not None)
+    if authors is None:
+        authors = list(User.objects.filter(
+            pk__in=model.objects.values('author')).order_by(
+            'username').values_list('pk', 'username'))
+        timeout = getattr(settings, 'GINYU_COUNT_CACHE_TIMEOUT', 60 * 60)
+        cache.set(key, authors, timeout)
+    return authors
+
+
+def cached_feed_items(name, build):
+    """
+    Returns `build()`, the items of the feed `name`, cached until the
+    'feed' group is invalidated or the next scheduled post goes live.
+    Every format of a feed shares the same entry.
+
+    """
+    key = FEED_KEY % (name, get_generations(['feed'])[0])
+    items = cache.get(key)
+    count_cache('feed', items is not None)
+    if items is None:
+        items = build()
+        timeout = getattr(settings, 'GINYU_FEED_CACHE_TIMEOUT', 60 * 60)
+        cache.set(key, items, timeout_until_next_publish(timeout))
+    return items
+
+
+def cached_active(name, groups, compute):
+    """
+    Returns `compute()`, the result of a query over active posts, cached
+    for the rest of the current GINYU_ACTIVE_BUCKET or until one of
+    `groups` is invalidated. Without a bucket every call is a query.
+
+    """
+    from .models import active_now
+
+    bucket = getattr(settings, 'GINYU_ACTIVE_BUCKET', 0)
+    if not bucket:
+        return compute()
+
+    now = active_now()
+    bits = [name, now.isoformat()] + get_generations(groups)
+    key = ACTIVE_KEY % hashlib.md5(force_bytes('|'.join(bits))).hexdigest()
+    value = cache.get(key)
+    count_cache('active', value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, bucket)
+    return value
+
+
+def cache_page_groups(groups):
+    """
+    Decorator for function views. `groups` is a list of group name
+    templates that are filled in with the view's keyword arguments.
+
+    """
+    def decorator(view):
+        @wraps(view, assigned=available_attrs(view))
+        def wrapper(request, *args, **kwargs):
+            names = [g % kwargs for g in groups]
+            return cached_response(request, names,
+                                   lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def sitemap_size():
+    return getattr(settings, 'GINYU_SITEMAP_SIZE', 10000)
+
+
+def sitemap_group(section, pk):
+    """Sitemaps are chunked by ranges of `sitemap_size()` ids."""
+    return 'sitemap:%s:%d' % (section, pk // sitemap_size())
+
+
+def post_group(post, original=False):
+    date, slug = post.publish_date, post.slug
+    if original:
+        date, slug = post.original('publish_date'), post.original('slug')
+    return detail_group(date, slug)
+
+
+def detail_group(date, slug):
+    return 'post:%s/%s' % (date.strftime('%Y'), slug)
+
+
+def post_groups(post):
+    """Every group a change to `post` can affect."""
+    from .models import Post, Tag
+
+    groups = set(['list', 'archive', 'feed', 'tags', 'search', 'sitemap',
+                  sitemap_group('posts', post.pk)])
+    for original in (False, True):
+        groups.add(post_group(post, original))
+        date = post.original('publish_date') if original else post.publish_date
+        groups.add('year:%s' % date.strftime('%Y'))
+
+    # neighbours show this post's title and link in their footer
+    neighbours = Post.objects.filter(
+        pk__in=[post.previous_post_id, post.next_post_id])
+    groups.update(post_group(p) for p in neighbours.only('publish_date', 'slug'))
+
+    # a deleted post has lost its tag links, see models.remember_tags
+    if hasattr(post, '_tag_pks'):
+        tags = Tag.objects.filter(pk__in=post._tag_pks)
+    else:
+        tags = post.tags.all()
+    for pk, name, slug in tags.values_list('pk', 'name', 'slug'):
+        groups.update(['tag:%s' % name, 'tag:%s' % slug,
+                       sitemap_group('tags', pk)])
+    return groups
+
+
+def tag_groups(tag):
+    from .models import Post
+
+    groups = set(['list', 'feed', 'tags', 'tag:%s' % tag.name,
+                  'tag:%s' % tag.slug, 'sitemap', sitemap_group('tags', tag.pk)])
+    posts = Post.objects.filter(tags=tag).only('publish_date', 'slug')
+    for post in posts:
+        groups.update([post_group(post), sitemap_group('posts', post.pk)])
+    return groups
+
+
+def bulk_groups(model, pks):
+    """
+    Every group a change to the `model` objects `pks` can affect, the
+    set-based counterpart of `post_groups` for bulk updates. Takes a few
+    queries however many objects there are.
+
+    """
+    from .models import Post, Tag
+
+    if model is not Post:
+        groups = set(['search', 'sitemap'])
+        for pk, slug in model.objects.filter(pk__in=pks).values_list('pk', 'slug'):
+            groups.update(['page:%s' % slug, sitemap_group('pages', pk)])
+        return groups
+
+    groups = set(['list', 'archive', 'feed', 'tags', 'search', 'sitemap'])
+    neighbours = set()
+    for pk, date, slug, previous, following in Post.objects.filter(
+            pk__in=pks).values_list('pk', 'publish_date', 'slug',
+                                    'previous_post', 'next_post'):
+        groups.update([detail_group(date, slug), 'year:%s' % date.strftime('%Y'),
+                       sitemap_group('posts', pk)])
+        neighbours.update([previous, following])
+    for date, slug in Post.objects.filter(pk__in=neighbours - set([None])
+            ).values_list('publish_date', 'slug'):
+        groups.add(detail_group(date, slug))
+    for pk, name, slug in Tag.objects.filter(post__in=pks).distinct(
+            ).values_list('pk', 'name', 'slug'):
+        groups.update(['tag:%s' % name, 'tag:%s' % slug,
+                       sitemap_group('tags', pk)])
+    return groups
+
+
+def invalidate_saved(sender, instance, **kwargs):
+    """post_save and post_delete receiver for Post, Page and Tag."""
+    from .models import Post, Page, Tag
+
+    if sender is Post:
+        events.emit('pages', 'authors', *post_groups(instance))
+    elif sender is Page:
+        events.emit('pages', 'authors', 'search', 'sitemap',
+                    sitemap_group('pages', instance.pk),
+                    'page:%s' % instance.slug,
+                    'page:%s' % instance.original('slug'))
+    elif sender is Tag:
+        events.emit('pages', *tag_groups(instance))
+
+
+def invalidate_tagged(sender, instance, action, reverse, pk_set, **kwargs):
+    """m2m_changed receiver for Post.tags."""
+    from .models import Post, Tag
+
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        groups = tag_groups(instance)
+        if pk_set:
+            posts = Post.objects.filter(pk__in=pk_set).only('publish_date', 'slug')
+            for post in posts:
+                groups.update([post_group(post), sitemap_group('posts', post.pk)])
+    else:
+        groups = post_groups(instance)
+        for tag in Tag.objects.filter(pk__in=pk_set or []):
+            groups.update(['tag:%s' % tag.name, 'tag:%s' % tag.slug,
+                           sitemap_group('tags', tag.pk)])
+    events.emit('pages', *groups)
+
+
+# Conditional GET
+#
+# Views describe their content with a single aggregate query which gives
+# both the ETag and the Last-Modified validators. Matching requests get a
+# 304 before any object is loaded or template rendered.
+
+def make_validators(*values):
+    """
+    Returns an (etag, last_modified) pair for the given values. The
+    latest datetime among them is used as last_modified.
+
+    """
+    dates = [v for v in values if hasattr(v, 'utctimetuple')]
+    last_modified = max(dates) if dates else None
+    etag = hashlib.md5(force_bytes('|'.join(map(repr, values)))).hexdigest()
+    return etag, last_modified
+
+
+def queryset_validators(queryset):
+    """
+    Validators for a list of posts: the number of posts and the latest
+    `modified` and `publish_date` among them, so edits, new, removed and
+    newly published posts all change them.
+
+    """
+    stats = queryset.aggregate(count=Count('pk'), modified=Max('modified'),
+                               published=Max('publish_date'))
+    return make_validators(stats['count'], stats['modified'],
+                           stats['published'])
+
+
+def conditional(validators):
+    """
+    Decorator that answers conditional GETs. `validators` is called with
+    the view's arguments and returns an (etag, last_modified) pair; it is
+    only called once per request.
+
+    """
+    def get(request, *args, **kwargs):
+        if not hasattr(request, '_ginyu_validators'):
+            request._ginyu_validators = validators(request, *args, **kwargs)
+        return request._ginyu_validators
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: get(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: get(request, *args, **kwargs)[1])
@@ -1,6 +1,9 @@
-from .models import Post, Tag
+from .caching import LazyTagList
 
 def include_taglist(request):
-    """Generates a list of tags to be added to every response."""
-    tags = Tag.objects.all()
-    return { 'tag_list': tags }
+    """
+    Adds the cached list of tags to every response. The list is only
+    loaded if the template uses it.
+
+    """
+    return { 'tag_list': LazyTagList() }
@@ -0,0 +1,134 @@
+"""
+Batched change events.
+
+The model signal receivers in `models` do not update counters, indexes
+and caches themselves. They `emit()` what has to be redone, e.g.
+('pages', 'tag:code') or ('tag_counts', 3), and the subscribers of each
+topic are called once with every key emitted for it. Saving a post
+three times, or a hundred posts with the same tag, then means one
+recount of that tag and one page cache invalidation.
+
+Inside a `batch()` events are collected until the outermost batch
+ends. Add `ginyu.events.EventBatchMiddleware` to MIDDLEWARE_CLASSES,
+above TransactionMiddleware if that is used, to batch each request and
+flush after its transaction is committed. Outside a request, put the
+batch outside `transaction.commit_on_success` for the same effect.
+Outside a batch every event is handled right away.
+
+A batch that ends with an exception drops its events instead, as the
+changes they describe were rolled back. `ginyu_reconcile` repairs the
+counts of changes that were committed before the exception.
+
+"""
+from functools import wraps
+import threading
+
+_local = threading.local()
+
+# topic -> handlers, and the topics in the order they are handled
+_subscribers = {}
+_topics = []
+
+
+def subscribe(topic, handler):
+    """
+    Calls `handler(keys)` with the set of keys emitted for `topic` when a
+    batch is flushed. Topics are handled in the order of their first
+    subscription.
+
+    """
+    if topic not in _subscribers:
+        _subscribers[topic] = []
+        _topics.append(topic)
+    if handler not in _subscribers[topic]:
+        _subscribers[topic].append(handler)
+
+
+def unsubscribe(topic, handler):
+    if handler in _subscribers.get(topic, ()):
+        _subscribers[topic].remove(handler)
+
+
+def state():
+    if not hasattr(_local, 'depth'):
+        _local.depth, _local.pending = 0, {}
+    return _local
+
+
+def emit(topic, *keys):
+    """Notes that `keys` of `topic` changed. Repeated keys are merged."""
+    local = state()
+    local.pending.setdefault(topic, set()).update(keys)
+    if not local.depth:
+        flush()
+
+
+def flush():
+    """
+    Hands the pending events to their subscribers. Events emitted by a
+    subscriber are handled in the same flush, so page invalidation,
+    handled last, sees everything the counters and indexes changed.
+
+    """
+    local = state()
+    depth, local.depth = local.depth, local.depth + 1
+    try:
+        while local.pending:
+            topic = next((t for t in _topics if t in local.pending), None)
+            if topic is None:
+                local.pending.clear()
+                break
+            keys = local.pending.pop(topic)
+            for handler in _subscribers[topic]:
+                handler(keys)
+    finally:
+        local.depth = depth
+
+
+class batch(object):
+    """
+    Context manager and decorator that holds back events until the
+    outermost batch ends.
+
+    """
+    def __enter__(self):
+        state().depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        local = state()
+        local.depth -= 1
+        if not local.depth:
+            if exc_type is None:
+                flush()
+            else:
+                local.pending.clear()
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class EventBatchMiddleware(object):
+    """
+    Handles the events of a request once, after its response is made,
+    and drops them if the view raised.
+
+    """
+    def process_request(self, request):
+        state().depth += 1
+        request._ginyu_batch = True
+
+    def process_exception(self, request, exception):
+        if getattr(request, '_ginyu_batch', False):
+            del request._ginyu_batch
+            batch().__exit__(type(exception), exception, None)
+
+    def process_response(self, request, response):
+        if getattr(request, '_ginyu_batch', False):
+            del request._ginyu_batch
+            batch().__exit__(None, None, None)
+        return response
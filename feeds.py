@@ -1,5 +1,83 @@
+"""
+RSS, Atom and JSON feeds of the newest posts, overall and per tag.
+
+The items of a feed are built once and cached by `caching` until a post
+is published or edited, and every format is rendered from that cached
+item set. The full archive feeds are streamed in chunks, so they never
+have to sit in memory as a whole.
+
+"""
+from django.conf import settings
 from django.contrib.syndication.views import Feed
-from .models import Post
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.feedgenerator import (Atom1Feed, SyndicationFeed,
+                                        rfc3339_date)
+from django.utils.xmlutils import SimplerXMLGenerator
+
+import json
+
+from .caching import cached_feed_items
+from .models import Post, Tag
+from .paginators import KeysetPaginator
+
+
+def item_data(post):
+    """The parts of `post` shown in feeds, as plain cacheable values."""
+    return {
+        'title': post.title,
+        'link': post.get_absolute_url(),
+        'description': post.rendered_excerpt,
+        'pubdate': post.publish_date,
+        'author_name': post.author.get_full_name() or post.author.username,
+        'categories': [tag.name for tag in post.tags.all()],
+    }
+
+
+def feed_items(tag=None):
+    """
+    Returns the item data of the newest `GINYU_FEED_SIZE` posts, with
+    the given tag if any.
+
+    """
+    def build():
+        posts = Post.objects.listing(tags=True)
+        if tag is not None:
+            posts = posts.filter(tags=tag)
+        size = getattr(settings, 'GINYU_FEED_SIZE', 10)
+        return [item_data(p) for p in posts.order_by('-publish_date')[:size]]
+
+    return cached_feed_items('tag:%s' % tag.pk if tag else 'latest', build)
+
+
+class JSONFeed(SyndicationFeed):
+    """A JSON Feed (https://jsonfeed.org/version/1) generator."""
+    mime_type = 'application/feed+json; charset=utf-8'
+
+    def write(self, outfile, encoding):
+        feed = {
+            'version': 'https://jsonfeed.org/version/1',
+            'title': self.feed['title'],
+            'home_page_url': self.feed['link'],
+            'feed_url': self.feed['feed_url'],
+            'description': self.feed['description'],
+            'items': [self.item_json(item) for item in self.items],
+        }
+        outfile.write(json.dumps(feed))
+
+    def item_json(self, item):
+        data = {
+            'id': item['unique_id'] or item['link'],
+            'url': item['link'],
+            'title': item['title'],
+            'content_html': item['description'],
+            'tags': list(item['categories']),
+        }
+        if item['pubdate'] is not None:
+            data['date_published'] = rfc3339_date(item['pubdate'])
+        if item['author_name']:
+            data['author'] = {'name': item['author_name']}
+        return data
 
 
 class LastestPostsFeed(Feed):
@@ -13,15 +91,142 @@ class LastestPostsFeed(Feed):
     link = 'http://example.com/'
     description = 'Ginyu is a technical blogging platform developed with Django.'
 
+    def __call__(self, request, *args, **kwargs):
+        response = super(LastestPostsFeed, self).__call__(request, *args, **kwargs)
+        # Feed sets Last-Modified to the newest publish date, which misses
+        # edits. Leave it to `caching.conditional`.
+        del response['Last-Modified']
+        return response
+
     def items(self):
-        # Slice the queryset to show the 10 newest posts.
-        return Post.objects.active().order_by('-publish_date')[:10]
+        return feed_items()
 
     def item_title(self, item):
-        return item.title
+        return item['title']
 
     def item_description(self, item):
-        return item.rendered_excerpt
+        return item['description']
 
     def item_link(self, item):
-        return item.get_absolute_url()
\ No newline at end of file
+        return item['link']
+
+    def item_pubdate(self, item):
+        return item['pubdate']
+
+    def item_author_name(self, item):
+        return item['author_name']
+
+    def item_categories(self, item):
+        return item['categories']
+
+
+class LatestPostsAtomFeed(LastestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LastestPostsFeed.description
+
+
+class LatestPostsJSONFeed(LastestPostsFeed):
+    feed_type = JSONFeed
+
+
+class TagPostsFeed(LastestPostsFeed):
+    """The newest posts with a given tag."""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Tag, slug=slug)
+
+    def title(self, obj):
+        return '%s: %s' % (LastestPostsFeed.title, obj.name)
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def items(self, obj):
+        return feed_items(obj)
+
+
+class TagPostsAtomFeed(TagPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LastestPostsFeed.description
+
+
+class TagPostsJSONFeed(TagPostsFeed):
+    feed_type = JSONFeed
+
+
+class Buffer(object):
+    """A file-like object that hands out what was written to it."""
+    def __init__(self):
+        self.bits = []
+
+    def write(self, data):
+        self.bits.append(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = self.bits[0][:0].join(self.bits) if self.bits else b''
+        self.bits = []
+        return data
+
+
+def stream_feed(feeds):
+    """
+    Yields a feed document piece by piece. `feeds` are feed generators
+    holding consecutive chunks of the items. The first one writes the
+    document around its items, the others only their items, so just one
+    chunk is in memory at a time.
+
+    """
+    feed = next(feeds)
+    out, parts = Buffer(), []
+    write_items = feed.write_items
+
+    def mark(handler):
+        parts.append(out.take())
+        write_items(handler)
+        parts.append(out.take())
+
+    feed.write_items = mark
+    feed.write(out, 'utf-8')
+    head, items = parts
+    tail = out.take()
+    yield head
+    yield items
+
+    for feed in feeds:
+        feed.write_items(SimplerXMLGenerator(out, 'utf-8'))
+        yield out.take()
+    yield tail
+
+
+class ArchiveFeed(LastestPostsFeed):
+    """
+    Every active post, newest first, as a streamed response. The posts
+    are loaded `chunk_size` at a time with a KeysetPaginator.
+
+    """
+    chunk_size = 200
+
+    def items(self, obj):
+        return obj
+
+    def chunks(self):
+        paginator = KeysetPaginator(Post.objects.listing(tags=True),
+                                    self.chunk_size)
+        page = paginator.page()
+        yield [item_data(p) for p in page]
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            yield [item_data(p) for p in page]
+
+    def __call__(self, request, *args, **kwargs):
+        feeds = (self.get_feed(chunk, request) for chunk in self.chunks())
+        return StreamingHttpResponse(stream_feed(feeds),
+                                     content_type=self.feed_type.mime_type)
+
+
+class ArchiveAtomFeed(ArchiveFeed):
+    feed_type = Atom1Feed
+    subtitle = LastestPostsFeed.description
@@ -0,0 +1,283 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client
+from optparse import make_option
+
+from multiprocessing.pool import ThreadPool
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+from ...models import Post, Page, Tag
+from ...sitemaps import SITEMAPS
+from ...views import PostListView, TagListView
+
+MANIFEST = '.ginyu_export.json'
+
+# File names used for urls ending in a slash, by content type.
+INDEX_FILES = (
+    ('text/html', 'index.html'),
+    ('application/rss+xml', 'index.xml'),
+    ('application/atom+xml', 'index.xml'),
+)
+
+STATIC_SKIP = ('node_modules',)
+STATIC_SKIP_EXTENSIONS = ('.styl',)
+
+
+def base_environ(base_url):
+    """
+    The WSGI environ of requests to `base_url`, so the absolute urls of
+    sitemaps and feeds point at the real site and ALLOWED_HOSTS accepts
+    the requests.
+
+    """
+    parts = urlsplit(base_url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc or \
+            parts.path not in ('', '/'):
+        raise CommandError('--base-url must look like https://example.com')
+    return {'HTTP_HOST': parts.netloc, 'wsgi.url_scheme': parts.scheme,
+            'HTTPS': 'on' if parts.scheme == 'https' else 'off'}
+
+
+def fetch(args):
+    """
+    Request `path` in a worker thread. `etag` is sent as If-None-Match,
+    so a page whose inputs have not changed comes back as a 304 without
+    being rendered.
+
+    """
+    path, etag, environ = args
+    headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+    response = Client(**environ).get(path, **headers)
+    if response.status_code == 304:
+        return path, 304, None, None, etag
+    if response.streaming:
+        content = b''.join(response.streaming_content)
+    else:
+        content = response.content
+    return (path, response.status_code, response['Content-Type'],
+            content, response.get('ETag'))
+
+
+def fetch_in_thread(args):
+    try:
+        return fetch(args)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Writes every public Ginyu url to a directory tree that can be '
+            'served by a plain file server. Pages that have not changed '
+            'since the last export are skipped.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--output', dest='output', default='ginyu_export',
+                    help='Directory to write the site to.'),
+        make_option('--workers', type='int', dest='workers', default=4,
+                    help='Number of pages rendered at once.'),
+        make_option('--full', action='store_true', dest='full',
+                    default=False,
+                    help='Render every page, not just the changed ones.'),
+        make_option('--base-url', dest='base_url',
+                    help='Scheme and host the site is served from, e.g. '
+                         'https://example.com. Defaults to the current '
+                         'Site if django.contrib.sites is installed.'),
+    )
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        self.output = options['output']
+        self.environ = base_environ(self.get_base_url(options['base_url']))
+        manifest_path = os.path.join(self.output, MANIFEST)
+        manifest = {'pages': {}, 'static': {}}
+        if not options['full'] and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        static = self.export_static(manifest['static'])
+        # pages refer to static files by their hashed names, so they all
+        # need rewriting when one of those changes
+        force = static != manifest['static']
+        pages = self.export_pages(manifest['pages'], static,
+                                  options['workers'], force)
+
+        with open(manifest_path, 'w') as f:
+            json.dump({'pages': pages, 'static': static}, f)
+
+    def get_base_url(self, base_url):
+        if base_url:
+            return base_url
+        if 'django.contrib.sites' not in settings.INSTALLED_APPS:
+            raise CommandError('--base-url is required without '
+                               'django.contrib.sites.')
+        from django.contrib.sites.models import Site
+        return 'http://%s' % Site.objects.get_current().domain
+
+    def get_paths(self):
+        """Every public url of the blog."""
+        root = reverse('PostListView')
+        paths = [root, root + 'archive/', root + 'tags/all/', root + 'rss/',
+                 root + 'atom/', root + 'feed.json', root + 'archive/rss/',
+                 root + 'archive/atom/']
+
+        per_page = PostListView.paginate_by
+        pages = (Post.objects.active().count() + per_page - 1) // per_page
+        paths.extend(reverse('PostListView', kwargs={'page': n})
+                     for n in range(2, pages + 1))
+
+        paths.extend(root + '%s/' % d.year for d in
+                     Post.objects.active().dates('publish_date', 'year'))
+        paths.extend(p.get_absolute_url() for p in
+                     Post.objects.active().only('slug', 'publish_date'))
+        paths.extend(p.get_absolute_url() for p in
+                     Page.objects.active().only('slug'))
+
+        per_page = TagListView.paginate_by
+        for slug, count in Tag.objects.filter(active_post_count__gt=0
+                ).values_list('slug', 'active_post_count'):
+            tag = reverse('TagListView', kwargs={'slug': slug})
+            paths.extend([tag, tag + 'rss/', tag + 'atom/', tag + 'feed.json'])
+            pages = (count + per_page - 1) // per_page
+            paths.extend(reverse('TagListView', kwargs={'slug': slug, 'page': n})
+                         for n in range(2, pages + 1))
+
+        paths.append(reverse('ginyu_sitemap_index'))
+        for section, sitemap in SITEMAPS:
+            paths.extend(reverse('ginyu_sitemap', kwargs={'section': section,
+                                                          'chunk': number})
+                         for number in sitemap.chunks())
+        return paths
+
+    def file_for(self, path, content_type):
+        name = path.lstrip('/')
+        if not name or name.endswith('/'):
+            index = 'index.html'
+            for prefix, filename in INDEX_FILES:
+                if content_type.startswith(prefix):
+                    index = filename
+            name += index
+        return name
+
+    def export_pages(self, previous, static, workers, force=False):
+        """
+        Render the pages that changed, or all of them if `force` is set,
+        and delete those that are gone. Returns the new
+        {path: {'file', 'etag'}} manifest.
+
+        """
+        paths = self.get_paths()
+        jobs = [(p, None if force else previous.get(p, {}).get('etag'),
+                 self.environ) for p in paths]
+
+        if workers > 1:
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(fetch_in_thread, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [fetch(job) for job in jobs]
+
+        pattern = self.static_pattern(static) if static else None
+        pages, written = {}, 0
+        for path, status, content_type, content, etag in results:
+            if status == 304:
+                pages[path] = previous[path]
+                continue
+            if status != 200:
+                self.log('Skipped %s (%d)' % (path, status))
+                continue
+            name = self.file_for(path, content_type)
+            self.write(name, self.rewrite_static(content, static, pattern))
+            pages[path] = {'file': name, 'etag': etag}
+            written += 1
+
+        for path in set(previous) - set(pages):
+            self.remove(previous[path]['file'])
+        self.log('Wrote %d of %d pages.' % (written, len(paths)))
+        return pages
+
+    def export_static(self, previous):
+        """
+        Copy the app's static files with a hash of their content in their
+        names, so they can be cached forever. Returns a {url: hashed url}
+        map. Stylesheets are copied last since their references to other
+        static files are rewritten too.
+
+        """
+        source = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__)))), 'static')
+        static_url = getattr(settings, 'STATIC_URL', None) or '/static/'
+
+        files = []
+        for root, dirs, names in os.walk(source):
+            dirs[:] = [d for d in dirs if d not in STATIC_SKIP]
+            files.extend(os.path.relpath(os.path.join(root, n), source)
+                         for n in names
+                         if not n.endswith(STATIC_SKIP_EXTENSIONS))
+        files.sort(key=lambda f: (f.endswith('.css'), f))
+
+        urls = {}
+        for name in files:
+            with open(os.path.join(source, name), 'rb') as f:
+                content = f.read()
+            if name.endswith('.css'):
+                content = self.rewrite_static(content, urls)
+            digest = hashlib.md5(content).hexdigest()[:12]
+            base, ext = os.path.splitext(name.replace(os.sep, '/'))
+            hashed = '%s.%s%s' % (base, digest, ext)
+            urls[static_url + name.replace(os.sep, '/')] = static_url + hashed
+
+            # the plain name is kept for relative references in css
+            for url in (static_url + name.replace(os.sep, '/'),
+                        static_url + hashed):
+                self.write(url.lstrip('/'), content)
+
+        for url in set(previous.values()) - set(urls.values()):
+            self.remove(url.lstrip('/'))
+        return urls
+
+    def rewrite_static(self, content, urls, pattern=None):
+        """
+        Point references to static files at their hashed names. `pattern`
+        is the compiled `static_pattern(urls)`, if at hand.
+
+        """
+        if not urls:
+            return content
+        pattern = pattern or self.static_pattern(urls)
+        return pattern.sub(lambda m: urls[m.group(0).decode()].encode(),
+                           content)
+
+    def static_pattern(self, urls):
+        return re.compile('|'.join(
+            re.escape(u) for u in sorted(urls, key=len, reverse=True)).encode())
+
+    def write(self, name, content):
+        path = os.path.join(self.output, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        shutil.move(path + '.tmp', path)
+
+    def remove(self, name):
+        path = os.path.join(self.output, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def log(self, message):
+        if self.verbosity > 0:
+            self.stdout.write(message)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ...models import ArchiveMonth, Tag
+
+
+class Command(BaseCommand):
+    help = ('Recomputes denormalized counts. Run it periodically so that '
+            'scheduled posts are counted once they go live.')
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        changed = Tag.objects.reconcile()
+        if verbosity > 0:
+            self.stdout.write('Updated post counts of %d tag(s).' % changed)
+
+        changed = ArchiveMonth.objects.reconcile()
+        if verbosity > 0:
+            self.stdout.write('Updated post counts of %d archive month(s).'
+                              % changed)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from optparse import make_option
+
+from itertools import islice
+
+from ...models import Post, Page, SearchEntry
+from ... import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of every Post and Page.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=500,
+                    help='Documents indexed and written per batch.'),
+    )
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        batch_size = options['batch_size']
+
+        for model in (Post, Page):
+            kind = search.kind_of(model)
+            SearchEntry.objects.filter(kind=kind).delete()
+
+            fields = ['pk'] + [f for f, w in search.FIELD_WEIGHTS]
+            rows = model.objects.order_by('pk').values(*fields).iterator()
+            total = 0
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                entries = []
+                for values in batch:
+                    terms = search.document_terms(model(**values))
+                    entries.extend(
+                        SearchEntry(kind=kind, object_id=values['pk'],
+                                    term=term, weight=weight)
+                        for term, weight in terms.items())
+                SearchEntry.objects.bulk_create(entries)
+                total += len(batch)
+
+            if verbosity > 0:
+                self.stdout.write('Indexed %d %s(s).' % (total, kind))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ... import events
+from ...models import Post
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stored previous/next links between posts.'
+
+    @events.batch()
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        changed, total = Post.objects.relink_all()
+
+        if verbosity > 0:
+            self.stdout.write('Relinked %d of %d posts.' % (changed, total))
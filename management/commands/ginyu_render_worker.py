@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from optparse import make_option
+
+import time
+
+from ...tasks import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Renders Post and Page objects that are marked render pending.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once', default=False,
+                    help='Process the pending rows once and exit.'),
+        make_option('--interval', type='float', dest='interval', default=5,
+                    help='Seconds to wait between polls.'),
+        make_option('--batch', type='int', dest='batch', default=50,
+                    help='Maximum number of objects to render per poll.'),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        while True:
+            count = process_pending(limit=options['batch'])
+            if count and verbosity > 0:
+                self.stdout.write('Rendered %d object(s).' % count)
+            if options['once']:
+                break
+            if count < options['batch']:
+                time.sleep(options['interval'])
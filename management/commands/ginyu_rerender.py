@@ -0,0 +1,176 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from optparse import make_option
+
+from datetime import datetime
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+import json
+import os
+
+from ... import events, tasks
+from ...models import Post, Page
+from ...renderers import get_renderer
+
+MODELS = {'post': Post, 'page': Page}
+
+
+def render_row(args):
+    """
+    Render a single row in a worker. Only plain values cross the worker
+    boundary, the worker never touches the database. Returns the row's
+    pk, `modified` and `render_pending` as read, and the rendered fields
+    that differ from the stored ones.
+
+    """
+    model, values = args
+    obj = model(**values)
+    obj.render(force=True)
+    changed = dict((f, getattr(obj, f)) for f in obj.rendered_fields
+                   if getattr(obj, f) != values[f])
+    return values['pk'], values['modified'], values['render_pending'], changed
+
+
+class Command(BaseCommand):
+    help = ('Re-renders the html fields of every Post and Page, for example '
+            'after switching renderer or Pygments theme.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--model', action='append', dest='models',
+                    choices=list(MODELS),
+                    help='Only re-render this model (post or page). '
+                         'May be given more than once.'),
+        make_option('--since', dest='since',
+                    help='Only rows published on or after YYYY-MM-DD.'),
+        make_option('--until', dest='until',
+                    help='Only rows published before YYYY-MM-DD.'),
+        make_option('--tag', dest='tag',
+                    help='Only posts with the tag of this slug.'),
+        make_option('--stale', action='store_true', dest='stale',
+                    default=False,
+                    help='Only rows rendered by another renderer version.'),
+        make_option('--workers', type='int', dest='workers', default=4,
+                    help='Number of render workers.'),
+        make_option('--processes', action='store_true', dest='processes',
+                    default=False,
+                    help='Render in worker processes instead of threads.'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=100,
+                    help='Rows rendered and written per batch.'),
+        make_option('--checkpoint', dest='checkpoint',
+                    default='.ginyu_rerender.json',
+                    help='File used to resume an interrupted run.'),
+        make_option('--restart', action='store_true', dest='restart',
+                    default=False,
+                    help='Ignore an existing checkpoint.'),
+    )
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        self.checkpoint_path = options['checkpoint']
+        self.checkpoint = {}
+        if not options['restart'] and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                self.checkpoint = json.load(f)
+            self.log('Resuming from %s' % self.checkpoint_path)
+
+        if options['processes']:
+            # forked workers must not share the parent's connection
+            connection.close()
+            pool = Pool(options['workers'])
+        else:
+            pool = ThreadPool(options['workers'])
+
+        try:
+            for name in options['models'] or sorted(MODELS):
+                if options['tag'] and name != 'post':
+                    continue
+                queryset = self.get_queryset(MODELS[name], options)
+                self.rerender(name, queryset, pool, options['batch_size'])
+        finally:
+            pool.close()
+            pool.join()
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def get_queryset(self, model, options):
+        queryset = model.objects.all()
+        if options['since']:
+            queryset = queryset.filter(
+                publish_date__gte=self.parse_date(options['since']))
+        if options['until']:
+            queryset = queryset.filter(
+                publish_date__lt=self.parse_date(options['until']))
+        if options['tag']:
+            queryset = queryset.filter(tags__slug=options['tag'])
+        if options['stale']:
+            queryset = queryset.exclude(render_version=get_renderer().version)
+        return queryset
+
+    def parse_date(self, value):
+        try:
+            date = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+        return timezone.make_aware(date, timezone.utc)
+
+    def rerender(self, name, queryset, pool, batch_size):
+        model = queryset.model
+        fields = ['pk', 'modified', 'render_pending'] + list(model.source_fields)
+        fields += [f for f in model.rendered_fields if f not in fields]
+        last_pk = self.checkpoint.get(name, 0)
+        rows = (queryset.filter(pk__gt=last_pk).order_by('pk')
+                .values(*fields).iterator())
+
+        total = changed = 0
+        while True:
+            batch = [(model, values) for values in islice(rows, batch_size)]
+            if not batch:
+                break
+            results = pool.map(render_row, batch)
+            changed += self.write(model, results)
+            total += len(results)
+            self.checkpoint[name] = results[-1][0]
+            self.save_checkpoint()
+            self.log('%s: %d rendered, %d changed' % (name, total, changed))
+
+    @events.batch()
+    @transaction.commit_on_success
+    def write(self, model, results):
+        """
+        Write a batch back with plain UPDATEs, which skip the save()
+        pipeline, and return the number of rows whose html changed.
+
+        Rows whose html is unchanged are left alone, bar a new
+        render_version or a pending flag. Changed rows get a new
+        `modified`, so the conditional GETs see the new html, and their
+        cached pages and index entries are dropped once the batch is
+        committed. As in `tasks.render_object`, a row saved again since
+        it was read is skipped; that save rendered it anew.
+
+        """
+        now = timezone.now()
+        changed = []
+        for pk, modified, pending, fields in results:
+            if not fields and not pending:
+                continue
+            if set(fields) - set(['render_version']):
+                fields['modified'] = now
+            updated = model.objects.filter(pk=pk, modified=modified).update(
+                render_pending=False, render_attempts=0, render_after=None,
+                **fields)
+            if updated and 'modified' in fields:
+                changed.append(pk)
+        tasks.rendered(model, changed)
+        return len(changed)
+
+    def save_checkpoint(self):
+        with open(self.checkpoint_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+
+    def log(self, message):
+        if self.verbosity > 0:
+            self.stdout.write(message)
@@ -0,0 +1,237 @@
+"""
+Per-request instrumentation of Ginyu views.
+
+Add `ginyu.metrics.MetricsMiddleware` to MIDDLEWARE_CLASSES to record,
+for every request, the database queries and their time, the time spent
+rendering templates, the markup renders and their time, and the hits
+and misses of each Ginyu cache. Each response then carries them in a
+`Server-Timing` header, and the totals per view are kept in process and
+served by the `metrics` view in the Prometheus text format.
+
+Outside a recorded request `timer()` and `count_cache()` do nothing, so
+the hooks in `caching` and `renderers` cost next to nothing when the
+middleware is not installed.
+
+"""
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.template.base import Template
+
+from functools import wraps
+import logging
+import threading
+import time
+
+logger = logging.getLogger('ginyu.metrics')
+
+_local = threading.local()
+
+
+class Recorder(object):
+    """The measurements of a single request."""
+    def __init__(self):
+        self.start = time.time()
+        self.view = None
+        self.timings = {}
+        self.calls = {}
+        self.caches = {}
+        self.depth = {}
+
+    def add(self, name, seconds, calls=1):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count_cache(self, name, hit):
+        hits, misses = self.caches.get(name, (0, 0))
+        self.caches[name] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+
+def current():
+    """Returns the Recorder of the request being handled, if any."""
+    return getattr(_local, 'recorder', None)
+
+
+class timer(object):
+    """
+    Context manager adding the time of its block to the metric `name`
+    of the current request. Nested blocks of the same name, such as
+    included templates, are only counted once.
+
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.recorder = current()
+        if self.recorder is not None:
+            depth = self.recorder.depth.get(self.name, 0)
+            self.recorder.depth[self.name] = depth + 1
+            if not depth:
+                self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.depth[self.name] -= 1
+            if not recorder.depth[self.name]:
+                recorder.add(self.name, time.time() - self.start)
+
+
+def count_cache(name, hit):
+    """Records a hit or miss of the Ginyu cache `name`."""
+    recorder = current()
+    if recorder is not None:
+        recorder.count_cache(name, hit)
+
+
+class Aggregate(object):
+    """Totals of the recorded requests, per view, since the process started."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def add(self, recorder, total):
+        with self._lock:
+            stats = self.views.setdefault(recorder.view, {
+                'requests': 0, 'seconds': 0.0, 'timings': {}, 'calls': {},
+                'caches': {}})
+            stats['requests'] += 1
+            stats['seconds'] += total
+            for name, seconds in recorder.timings.items():
+                stats['timings'][name] = stats['timings'].get(name, 0.0) + seconds
+                stats['calls'][name] = (stats['calls'].get(name, 0) +
+                                        recorder.calls[name])
+            for name, (hits, misses) in recorder.caches.items():
+                old = stats['caches'].get(name, (0, 0))
+                stats['caches'][name] = (old[0] + hits, old[1] + misses)
+
+    def snapshot(self):
+        with self._lock:
+            return dict((view, {
+                'requests': s['requests'], 'seconds': s['seconds'],
+                'timings': dict(s['timings']), 'calls': dict(s['calls']),
+                'caches': dict(s['caches'])}) for view, s in self.views.items())
+
+    def clear(self):
+        with self._lock:
+            self.views.clear()
+
+
+aggregate = Aggregate()
+
+
+def instrument_templates():
+    """Times Template._render, the way Django's test runner instruments it."""
+    if getattr(Template._render, 'ginyu_timed', False):
+        return
+    render = Template._render
+
+    @wraps(render)
+    def timed_render(self, context):
+        with timer('template'):
+            return render(self, context)
+    timed_render.ginyu_timed = True
+    Template._render = timed_render
+
+
+def view_name(view_func):
+    name = getattr(view_func, '__name__', None)
+    return name or type(view_func).__name__
+
+
+def server_timing(recorder, total):
+    """Returns the Server-Timing header value for a finished request."""
+    bits = []
+    for name in sorted(recorder.timings):
+        bits.append('%s;dur=%.1f;desc="%d call(s)"' % (
+            name, recorder.timings[name] * 1000, recorder.calls[name]))
+    for name in sorted(recorder.caches):
+        hits, misses = recorder.caches[name]
+        bits.append('cache-%s;desc="%d hit(s), %d miss(es)"' % (
+            name, hits, misses))
+    bits.append('total;dur=%.1f' % (total * 1000))
+    return ', '.join(bits)
+
+
+class MetricsMiddleware(object):
+    """
+    Records the metrics of every request, see the module docstring.
+    Set GINYU_SERVER_TIMING to False to keep them out of the responses.
+
+    Queries are counted with the debug cursor, as in DEBUG mode, so
+    their sql is kept in `connection.queries` until the request ends.
+
+    """
+    def __init__(self):
+        instrument_templates()
+
+    def process_request(self, request):
+        _local.recorder = Recorder()
+        _local.queries = (connection.use_debug_cursor, len(connection.queries))
+        connection.use_debug_cursor = True
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = current()
+        if recorder is not None:
+            recorder.view = view_name(view_func)
+
+    def process_response(self, request, response):
+        recorder = current()
+        if recorder is None:
+            return response
+        use_debug_cursor, start = _local.queries
+        queries = connection.queries[start:]
+        connection.use_debug_cursor = use_debug_cursor
+        _local.recorder = _local.queries = None
+
+        if queries:
+            recorder.add('db', sum(float(q['time']) for q in queries),
+                         len(queries))
+        total = time.time() - recorder.start
+        recorder.view = recorder.view or 'unresolved'
+        aggregate.add(recorder, total)
+
+        if getattr(settings, 'GINYU_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(recorder, total)
+        logger.debug('%s %s %s', recorder.view, request.path,
+                     server_timing(recorder, total))
+        return response
+
+
+def prometheus(stats):
+    """Formats `Aggregate.snapshot()` in the Prometheus text format."""
+    lines = []
+    for view in sorted(stats):
+        s = stats[view]
+        label = 'view="%s"' % view
+        lines.append('ginyu_requests_total{%s} %d' % (label, s['requests']))
+        lines.append('ginyu_request_seconds_total{%s} %f' % (label, s['seconds']))
+        for name in sorted(s['timings']):
+            label = 'view="%s",part="%s"' % (view, name)
+            lines.append('ginyu_part_seconds_total{%s} %f' % (
+                label, s['timings'][name]))
+            lines.append('ginyu_part_calls_total{%s} %d' % (
+                label, s['calls'][name]))
+        for name in sorted(s['caches']):
+            hits, misses = s['caches'][name]
+            label = 'view="%s",cache="%s"' % (view, name)
+            lines.append('ginyu_cache_hits_total{%s} %d' % (label, hits))
+            lines.append('ginyu_cache_misses_total{%s} %d' % (label, misses))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """
+    The recorded totals of this process, for staff users and the
+    INTERNAL_IPS only.
+
+    """
+    user = getattr(request, 'user', None)
+    staff = user is not None and user.is_staff
+    if not staff and (request.META.get('REMOTE_ADDR') not in
+                      getattr(settings, 'INTERNAL_IPS', ())):
+        raise Http404('No metrics here.')
+    return HttpResponse(prometheus(aggregate.snapshot()),
+                        content_type='text/plain; version=0.0.4')
@@ -1,29 +1,214 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, Min, Q
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.contrib.auth.models import User
 from django.utils.html import strip_tags
-from django.utils.text import Truncator
-from datetime import datetime
+from django.utils.encoding import force_text
+from django.utils.text import Truncator, slugify
+from calendar import timegm
+from datetime import date, datetime
+from django.utils import timezone
 from django.utils.timezone import utc
 
-import requests
-import json
+from .renderers import get_renderer, render_markup
+from . import caching, events, search, tasks
 
-def render_markup(markdown):
+
+class RenderPipelineMixin(object):
     """
-    Uses the github api to return html markup.
+    Renders a model's markup fields in a single pass.
+
+    `content` is rendered once and `rendered_content`, the description
+    and (for models that have one) the excerpt are all derived from that
+    output. The values of `tracked_fields` are remembered when the object
+    is loaded so changes can be detected without another query.
+
+    When background rendering is enabled (see `tasks`) saving only stores
+    the source fields and marks the row `render_pending`. Saves that leave
+    the source fields alone render nothing, and `save(update_fields=...)`
+    writes only the given fields plus whatever rendering them produced.
 
     """
-    headers = {'content-type': 'application/json'}
+    source_fields = ('content', 'html_mode', 'description')
+    rendered_fields = ('rendered_content', 'description', 'render_version')
+    render_state_fields = ('render_pending', 'render_attempts', 'render_after')
+    tracked_fields = source_fields + ('slug', 'title')
+
+    def snapshot(self):
+        """
+        Remember the current tracked field values. Deferred fields are
+        skipped so that taking the snapshot never triggers a query.
+
+        """
+        self._original = dict((f, self.__dict__[f])
+                              for f in self.tracked_fields
+                              if f in self.__dict__)
+
+    def has_changed(self, field):
+        """Returns True if `field` differs from its value when loaded."""
+        if self._state.adding:
+            return True
+        missing = object()
+        return (self._original.get(field, missing) !=
+                self.__dict__.get(field, missing))
+
+    def original(self, field):
+        """Returns the value `field` had when the object was loaded."""
+        if field in self._original:
+            return self._original[field]
+        return getattr(self, field)
+
+    def render_outdated(self):
+        """
+        Returns True if the html was made by another renderer version. A
+        deferred render_version is not loaded to find out.
+
+        """
+        version = get_renderer().version
+        return self.__dict__.get('render_version', version) != version
+
+    def needs_render(self):
+        return (self.render_outdated() or
+                any(self.has_changed(f) for f in self.source_fields))
+
+    def render(self, force=False):
+        """
+        Render every html field from a single rendering of `content`.
+        `content` is only rendered again when it or `html_mode` changed,
+        the html is outdated or `force` is set.
+
+        """
+        if (force or self.render_outdated() or self.has_changed('content') or
+                self.has_changed('html_mode')):
+            self.render_content()
+        self.meta_description()
+        self.render_version = get_renderer().version
 
-    context = {
-        "text": markdown,
-        "mode": "gfm",
-        "context": "github/sawboo"
-    }
+    def prepare_render(self, update_fields=None):
+        """
+        Called before saving. Either renders now or marks the object to
+        be rendered in the background, if a source field changed.
 
-    r = requests.post('https://api.github.com/markdown', data=json.dumps(context), headers=headers)
+        Returns `update_fields` with `modified` and the fields written by
+        rendering added, or None for a full save.
 
-    return r.text
+        """
+        if update_fields is not None:
+            if not update_fields:
+                return update_fields
+            update_fields = set(update_fields) | set(['modified'])
+            if not update_fields & set(self.source_fields):
+                return update_fields
+        if not self.needs_render():
+            return update_fields
+        if tasks.is_async():
+            self.render_pending = True
+            self.render_attempts = 0
+            self.render_after = None
+        else:
+            self.render()
+            self.render_pending = False
+        if update_fields is not None:
+            update_fields.update(self.rendered_fields + self.render_state_fields)
+        return update_fields
+
+    def finish_render(self):
+        """Called after saving to hand pending objects to the worker."""
+        self.snapshot()
+        if self.render_pending:
+            tasks.enqueue(self)
+
+    def render_content(self):
+        """
+        Render rendered_content from content, unless in html-mode.
+
+        """
+        if self.html_mode == False:
+            self.rendered_content = render_markup(self.content)
+        else:
+            self.rendered_content = self.content
+        return self.rendered_content
+
+    def meta_description(self):
+        """
+        If the meta-description is empty, create it from the rendered
+        content. Strip any html tags, then truncate the text to 25 words.
+
+        """
+        if len(self.description.strip()) == 0:
+            # remove extra html tags from the description
+            d = strip_tags(self.rendered_content)
+            self.description = Truncator(d).words(
+                    25,
+                    html=True,
+                    truncate=' ...'
+            )
+        return
+
+
+def active_now(bucket=None, now=None):
+    """
+    Returns the current time floored to `bucket` seconds, which defaults
+    to the GINYU_ACTIVE_BUCKET setting. Within a bucket every active()
+    query is identical, so its results can be cached; scheduled posts go
+    live at the first bucket boundary after their publish_date.
+
+    """
+    now = now or timezone.now()
+    if bucket is None:
+        bucket = getattr(settings, 'GINYU_ACTIVE_BUCKET', 0)
+    if not bucket:
+        return now
+    seconds = timegm(now.utctimetuple())
+    return datetime.utcfromtimestamp(seconds - seconds % bucket).replace(tzinfo=utc)
+
+
+class TagManager(models.Manager):
+    """
+    A custom manager for the Tag model.
+
+    """
+    def update_counts(self, pks):
+        """
+        Recompute `active_post_count` for the given tag ids.
+
+        """
+        for pk in set(pks) - set([None]):
+            count = Post.objects.active().filter(tags__pk=pk).count()
+            self.get_query_set().filter(pk=pk).exclude(
+                active_post_count=count).update(active_post_count=count)
+
+    def reconcile(self):
+        """
+        Recompute `active_post_count` for every tag, e.g. after scheduled
+        posts went live. Returns the number of tags that changed.
+
+        """
+        counts = dict(Post.objects.active().values_list('tags')
+                      .annotate(Count('pk')).order_by())
+        changed = 0
+        for pk, count in self.get_query_set().values_list(
+                'pk', 'active_post_count'):
+            if counts.get(pk, 0) != count:
+                self.get_query_set().filter(pk=pk).update(
+                    active_post_count=counts.get(pk, 0))
+                changed += 1
+        return changed
+
+    def free_slug(self, name, exclude=None):
+        """
+        Returns the slug of `name`, numbered if another tag has it.
+
+        """
+        base = slugify(force_text(name))[:56] or 'tag'
+        taken = set(self.get_query_set().filter(slug__startswith=base)
+                    .exclude(pk=exclude).values_list('slug', flat=True))
+        slug, n = base, 2
+        while slug in taken:
+            slug, n = '%s-%d' % (base, n), n + 1
+        return slug
 
 
 class Tag(models.Model):
@@ -33,18 +218,151 @@ class Tag(models.Model):
     """
     name = models.CharField(max_length=64, unique=True)
     slug = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    active_post_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TagManager()
 
     def __unicode__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Tags are looked up by slug, so a blank one is made from the name.
+
+        """
+        if not self.slug:
+            self.slug = Tag.objects.free_slug(self.name, exclude=self.pk)
+        super(Tag, self).save(*args, **kwargs)
+
     @models.permalink
     def get_absolute_url(self):
-        return ('articles_display_tag', (self.slug,))
+        return ('TagListView', (), {'slug': self.slug})
 
     class Meta:
         ordering = ('name',)
 
 
+def utc_month(value):
+    """Returns the (year, month) of a datetime in UTC."""
+    if timezone.is_aware(value):
+        value = value.astimezone(utc)
+    return value.year, value.month
+
+
+def month_range(year, month):
+    """Returns the (start, end) datetimes of a month in UTC."""
+    start = datetime(year, month, 1, tzinfo=utc)
+    if month == 12:
+        return start, datetime(year + 1, 1, 1, tzinfo=utc)
+    return start, datetime(year, month + 1, 1, tzinfo=utc)
+
+
+class ArchiveMonthManager(models.Manager):
+    """
+    A custom manager for the ArchiveMonth model.
+
+    """
+    def update_months(self, months):
+        """
+        Recompute the post counts of the given (year, month) pairs.
+
+        """
+        for year, month in set(months):
+            start, end = month_range(year, month)
+            count = Post.objects.active().filter(
+                publish_date__gte=start, publish_date__lt=end).count()
+            self.set_count(year, month, count)
+
+    def set_count(self, year, month, count):
+        queryset = self.get_query_set().filter(year=year, month=month)
+        if not count:
+            queryset.delete()
+        elif not queryset.update(post_count=count):
+            self.create(year=year, month=month, post_count=count)
+
+    def reconcile(self):
+        """
+        Recompute every month, e.g. after scheduled posts went live.
+        Returns the number of months that changed.
+
+        """
+        counts = {}
+        for d in Post.objects.active().values_list(
+                'publish_date', flat=True).order_by().iterator():
+            month = utc_month(d)
+            counts[month] = counts.get(month, 0) + 1
+
+        changed = 0
+        for year, month, count in self.get_query_set().values_list(
+                'year', 'month', 'post_count'):
+            new = counts.pop((year, month), 0)
+            if new != count:
+                self.set_count(year, month, new)
+                changed += 1
+        for (year, month), count in counts.items():
+            self.create(year=year, month=month, post_count=count)
+            changed += 1
+        return changed
+
+    def date_list(self, period='year', year=None, ordering='ASC'):
+        """
+        Returns the first days of the years or months that have active
+        posts, like `QuerySet.dates()` would for the posts.
+
+        """
+        queryset = self.get_query_set()
+        if year is not None:
+            queryset = queryset.filter(year=year)
+        prefix = '-' if ordering == 'DESC' else ''
+        if period == 'year':
+            years = queryset.order_by(prefix + 'year').values_list(
+                'year', flat=True).distinct()
+            return [date(y, 1, 1) for y in years]
+        months = queryset.order_by(prefix + 'year', prefix + 'month')
+        return [date(y, m, 1) for y, m in months.values_list('year', 'month')]
+
+    def adjacent_year(self, year, previous=False):
+        """
+        Returns the first day of the closest year before or after `year`
+        with active posts, or None.
+
+        """
+        if previous:
+            queryset = self.get_query_set().filter(year__lt=year).order_by('-year')
+        else:
+            queryset = self.get_query_set().filter(year__gt=year).order_by('year')
+        years = queryset.values_list('year', flat=True)[:1]
+        return date(years[0], 1, 1) if years else None
+
+
+class ArchiveMonth(models.Model):
+    """
+    The number of active posts published in a month, so archive views
+    can list dates without scanning the posts.
+
+    """
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    post_count = models.PositiveIntegerField(default=0)
+
+    objects = ArchiveMonthManager()
+
+    def __unicode__(self):
+        return '%d-%02d' % (self.year, self.month)
+
+    @property
+    def date(self):
+        return date(self.year, self.month, 1)
+
+    @models.permalink
+    def get_absolute_url(self):
+        return ('yearly', (), {'year': str(self.year)})
+
+    class Meta:
+        ordering = ('-year', '-month')
+        unique_together = (('year', 'month'),)
+
+
 class PostManager(models.Manager):
     """
     A custom manager for the Post model.
@@ -52,17 +370,214 @@ class PostManager(models.Manager):
     Define shortcut methods for making database querys.
 
     """
-    def active(self, user=None):
+    def active(self, user=None, now=None):
         """
         Retrieve non-draft posts that have past their publish_date.
 
         """
-        now = datetime.utcnow().replace(tzinfo=utc)
         return self.get_query_set().filter(
-            publish_date__lte=now, draft_mode=False)
+            publish_date__lte=active_now(now=now), draft_mode=False)
+
+    def next_publish_date(self):
+        """
+        Returns the publish_date of the next scheduled post, or None.
 
+        """
+        return self.get_query_set().filter(
+            publish_date__gt=active_now(), draft_mode=False).aggregate(
+            next=Min('publish_date'))['next']
 
-class Post(models.Model):
+    def listing(self, tags=False):
+        """
+        Active posts prepared for list templates. The author is joined,
+        tags are prefetched when `tags` is set and the full content
+        columns are left out since lists only show excerpts.
+
+        Tags are opt-in because date based views call `dates()` on the
+        same queryset, which cannot prefetch.
+
+        """
+        queryset = self.active().select_related('author').defer(
+            'content', 'rendered_content')
+        if tags:
+            queryset = queryset.prefetch_related('tags')
+        return queryset
+
+    def neighbours(self, post):
+        """
+        Returns the (previous, next) non-draft posts around `post`,
+        ordered by publish_date and then id.
+
+        """
+        queryset = self.get_query_set().filter(
+            draft_mode=False).exclude(pk=post.pk)
+        published = post.publish_date
+        before = queryset.filter(
+            Q(publish_date__lt=published) |
+            Q(publish_date=published, pk__lt=post.pk)
+            ).order_by('-publish_date', '-pk')[:1]
+        after = queryset.filter(
+            Q(publish_date__gt=published) |
+            Q(publish_date=published, pk__gt=post.pk)
+            ).order_by('publish_date', 'pk')[:1]
+        return (before[0] if before else None), (after[0] if after else None)
+
+    def relink(self, pks):
+        """
+        Recompute the stored previous/next links of the given posts.
+
+        """
+        for post in self.get_query_set().filter(pk__in=set(pks) - set([None])):
+            if post.draft_mode:
+                previous, following = None, None
+            else:
+                previous, following = self.neighbours(post)
+            ids = tuple(p.pk if p else None for p in (previous, following))
+            if (post.previous_post_id, post.next_post_id) != ids:
+                # the detail page footer shows the neighbours, so this
+                # counts as a change of the post
+                self.get_query_set().filter(pk=post.pk).update(
+                    previous_post=previous, next_post=following,
+                    modified=timezone.now())
+                events.emit('pages', caching.post_group(post),
+                            caching.sitemap_group('posts', post.pk))
+
+    def relink_all(self):
+        """
+        Rebuild the stored links of every post from a single ordered scan,
+        writing only the posts whose links changed. Returns the number of
+        changed and linked posts.
+
+        """
+        now = timezone.now()
+        queryset = self.get_query_set()
+        changed = 0
+
+        drafts = queryset.filter(draft_mode=True).exclude(
+            previous_post=None, next_post=None)
+        for pk, publish_date, slug in drafts.values_list(
+                'pk', 'publish_date', 'slug'):
+            queryset.filter(pk=pk).update(previous_post=None, next_post=None,
+                                          modified=now)
+            events.emit('pages', caching.detail_group(publish_date, slug),
+                        caching.sitemap_group('posts', pk))
+            changed += 1
+
+        chain = list(queryset.filter(draft_mode=False)
+                     .order_by('publish_date', 'pk')
+                     .values_list('pk', 'publish_date', 'slug',
+                                  'previous_post', 'next_post'))
+        ids = [None] + [row[0] for row in chain] + [None]
+        for i, row in enumerate(chain, 1):
+            pk, publish_date, slug, previous_id, next_id = row
+            if (previous_id, next_id) != (ids[i - 1], ids[i + 1]):
+                queryset.filter(pk=pk).update(previous_post=ids[i - 1],
+                                              next_post=ids[i + 1],
+                                              modified=now)
+                events.emit('pages', caching.detail_group(publish_date, slug),
+                            caching.sitemap_group('posts', pk))
+                changed += 1
+        return changed, len(chain)
+
+    def change_in_bulk(self, pks, change):
+        """
+        Calls `change(queryset)` to update the given rows with set-based
+        UPDATEs, then brings links, counts and caches up to date once for
+        all of them, as saving each row would. `change` should set
+        `modified` on the rows it changes and return how many it changed.
+
+        Only fields that are not rendered may be changed this way. Links
+        are only recomputed around rows whose publish_date or draft_mode
+        changed.
+
+        """
+        pks = list(pks)
+        is_post = self.model is Post
+        with events.batch():
+            groups = caching.bulk_groups(self.model, pks)
+            if is_post:
+                before = dict((row[0], row[1:]) for row in self.filter(
+                    pk__in=pks).values_list('pk', 'publish_date', 'draft_mode',
+                                            'previous_post', 'next_post'))
+
+            count = change(self.get_query_set().filter(pk__in=pks))
+
+            if count:
+                groups |= caching.bulk_groups(self.model, pks)
+                events.emit('pages', *groups)
+                if is_post:
+                    after = dict((row[0], row[1:]) for row in self.filter(
+                        pk__in=pks).values_list('pk', 'publish_date',
+                                                'draft_mode'))
+                    moved = [pk for pk in after if after[pk] != before[pk][:2]]
+                    if moved:
+                        # as update_links, for the old neighbours first
+                        # and then for the new ones
+                        old = [pk for m in moved for pk in before[m][2:]]
+                        self.relink(moved + old)
+                        new = self.filter(pk__in=moved).values_list(
+                            'previous_post', 'next_post')
+                        self.relink(set(pk for row in new for pk in row) -
+                                    set(moved + old))
+                    dates = [v[0] for v in (list(before.values()) +
+                                            list(after.values()))]
+                    events.emit('archive_months', *[utc_month(d) for d in dates])
+                    events.emit('tag_counts', *Tag.objects.filter(
+                        post__in=pks).values_list('pk', flat=True).distinct())
+                    events.emit('tag_list')
+        return count
+
+    def publish_now(self, pks):
+        """Takes the rows out of draft mode and publishes scheduled ones now."""
+        now = timezone.now()
+        return self.change_in_bulk(pks, lambda queryset: (
+            queryset.filter(publish_date__gt=now).update(
+                publish_date=now, draft_mode=False, modified=now) +
+            queryset.filter(draft_mode=True).update(
+                draft_mode=False, modified=now)))
+
+    def make_draft(self, pks):
+        now = timezone.now()
+        return self.change_in_bulk(pks, lambda queryset: queryset.filter(
+            draft_mode=False).update(draft_mode=True, modified=now))
+
+    def shift_publish_date(self, pks, delta):
+        """Moves the publish dates of the rows by the timedelta `delta`."""
+        now = timezone.now()
+        return self.change_in_bulk(pks, lambda queryset: queryset.update(
+            publish_date=F('publish_date') + delta, modified=now))
+
+    def tag_in_bulk(self, pks, tag, remove=False):
+        """
+        Adds `tag` to the given posts, or removes it, with one bulk insert
+        or delete. Returns the number of posts that changed.
+
+        """
+        through = self.model.tags.through
+        tagged = set(through.objects.filter(
+            post__in=pks, tag=tag).values_list('post', flat=True))
+        changed = tagged if remove else set(pks) - tagged
+        if not changed:
+            return 0
+
+        with events.batch():
+            groups = caching.bulk_groups(self.model, changed)
+            if remove:
+                through.objects.filter(post__in=changed, tag=tag).delete()
+            else:
+                through.objects.bulk_create([through(post_id=pk, tag=tag)
+                                             for pk in changed])
+            # tags are shown with their posts, see touch_tagged_posts
+            self.filter(pk__in=changed).update(modified=timezone.now())
+            groups.update(['tag:%s' % tag.name, 'tag:%s' % tag.slug,
+                           caching.sitemap_group('tags', tag.pk)])
+            events.emit('pages', *groups)
+            events.emit('tag_counts', tag.pk)
+            events.emit('tag_list')
+        return len(changed)
+
+
+class Post(RenderPipelineMixin, models.Model):
     """
     A model that stores data related to a single blog post.
 
@@ -70,7 +585,7 @@ class Post(models.Model):
     title = models.CharField(max_length=250)
     created = models.DateTimeField(auto_now_add=True, editable=False)
     modified = models.DateTimeField(auto_now=True, editable=False)
-    publish_date = models.DateTimeField(default=datetime.utcnow().replace(tzinfo=utc),
+    publish_date = models.DateTimeField(default=timezone.now,
                                         help_text=('The date and time this \
                                             article will be published.'))
     content = models.TextField()
@@ -98,16 +613,34 @@ class Post(models.Model):
                                      help_text='Posts in draft-mode will not \
                                      appear to regular users.')
     author = models.ForeignKey(User, related_name="posts")
+    next_post = models.ForeignKey('self', null=True, blank=True,
+                                  editable=False, related_name='+',
+                                  on_delete=models.SET_NULL)
+    previous_post = models.ForeignKey('self', null=True, blank=True,
+                                      editable=False, related_name='+',
+                                      on_delete=models.SET_NULL)
+    render_version = models.CharField(max_length=64, blank=True,
+                                      editable=False)
+    render_pending = models.BooleanField(default=False, db_index=True,
+                                         editable=False)
+    render_attempts = models.PositiveSmallIntegerField(default=0,
+                                                       editable=False)
+    render_after = models.DateTimeField(null=True, blank=True, editable=False)
 
     # attach our custom manager
     objects = PostManager()
 
+    source_fields = ('content', 'excerpt', 'html_mode', 'description')
+    rendered_fields = ('rendered_content', 'rendered_excerpt', 'excerpt',
+                       'description', 'render_version')
+    tracked_fields = source_fields + ('slug', 'title', 'publish_date',
+                                      'draft_mode')
+
     def __init__(self, *args, **kwargs):
         super(Post, self).__init__(*args, **kwargs)
 
-        self._excerpt = None
-        self._next = None
-        self._previous = None
+        self._neighbours = None
+        self.snapshot()
 
     def __unicode__(self):
         return self.title
@@ -117,34 +650,53 @@ class Post(models.Model):
         Call required methods before saving.
 
         """
-        self.render_content()
-        self.meta_description()
-
-        # If the excerpt is left blank it will be generated from
-        # `self.content`, possibly resulting in open markdown tags.
-        # We can still generate a proper `self.rendered_excerpt` by
-        # html truncating `self.rendered_content`. Before calling
-        # the save method, check to see if `self.excerpt` has
-        # changed before rendering it.
-        try:
-            original = Post.objects.get(pk=self.pk)
-            if original.excerpt != self.excerpt:
-                self.render_excerpt()
-        except Post.DoesNotExist:
-            self.render_excerpt()
-
+        relink = (self.has_changed('publish_date') or
+                  self.has_changed('draft_mode'))
+        update_fields = self.prepare_render(kwargs.get('update_fields'))
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
         super(Post, self).save(*args, **kwargs)
-
-    def render_content(self):
+        if relink:
+            self.update_links()
+            events.emit('tag_counts', *self.tags.values_list('pk', flat=True))
+            events.emit('archive_months', *[
+                utc_month(d) for d in (self.original('publish_date'),
+                                       self.publish_date) if d is not None])
+        self.finish_render()
+
+    def update_links(self):
         """
-        Use markdown2 to render post.rendered_content from post.content.
+        Close the gap left at the post's old position and link it in at
+        its new one. Links are rewritten with UPDATEs, which also bump
+        `modified` of the posts whose footer links changed.
 
         """
-        if self.html_mode == False:
-            self.rendered_content = render_markup(self.content)
+        old = [self.previous_post_id, self.next_post_id]
+        if self.draft_mode:
+            new = [None, None]
         else:
-            self.rendered_content = self.content
-        return self.rendered_content
+            new = [p.pk if p else None for p in Post.objects.neighbours(self)]
+        Post.objects.relink(old + new + [self.pk])
+        self.previous_post_id, self.next_post_id = new
+        self._neighbours = None
+
+    def render(self, force=False):
+        """
+        Render content, description and excerpt from a single rendering.
+
+        If the excerpt is left blank it will be generated from
+        `self.content`, possibly resulting in open markdown tags. We
+        can still generate a proper `self.rendered_excerpt` by html
+        truncating `self.rendered_content`. The excerpt is only
+        rendered again when it has changed since the post was loaded,
+        the html is outdated or `force` is set.
+
+        """
+        outdated = self.render_outdated()
+        super(Post, self).render(force)
+        if (force or outdated or self.has_changed('excerpt') or
+                self.has_changed('html_mode')):
+            self.render_excerpt()
 
     def render_excerpt(self):
         """
@@ -156,7 +708,7 @@ class Post(models.Model):
             if self.html_mode == False:
                 self.rendered_excerpt = render_markup(self.excerpt)
             else:
-                self.rendered_excerpt = self.content
+                self.rendered_excerpt = self.excerpt
         else:
             self.rendered_excerpt = Truncator(self.rendered_content).words(
                     80,
@@ -170,24 +722,6 @@ class Post(models.Model):
             )
         return self.excerpt
 
-    def meta_description(self):
-        """
-        If the meta-description is empty, create it from post.content.
-        First render the markdown, strip any html tags, then truncate
-        the text to 25 words.
-
-        """
-
-        if len(self.description.strip()) == 0:
-            # remove extra html tags from the description
-            d = strip_tags(render_markup(self.content))
-            self.description = Truncator(d).words(
-                    25,
-                    html=True,
-                    truncate=' ...'
-            )
-        return
-
     @models.permalink
     def get_absolute_url(self):
         return ('PostDetailView', (), {
@@ -195,49 +729,51 @@ class Post(models.Model):
                     'year': self.publish_date.strftime("%Y"),
                     })
 
+    def get_neighbours(self):
+        """
+        Returns the stored (previous, next) posts. Drafts are not linked
+        into the chain, so their neighbours are looked up instead.
+
+        """
+        if self._neighbours is None:
+            if self.draft_mode:
+                self._neighbours = Post.objects.neighbours(self)
+            else:
+                self._neighbours = (self.previous_post, self.next_post)
+        return self._neighbours
+
     def get_next_post(self):
         """
         Returns the next active post.
 
         """
-        if not self._next:
-            # First we get a queryset of all Post objects excluding
-            # the current Post. We then chop off any Posts that have
-            # a publish_date earlier than current Post. Finally, the
-            # queryset is sliced to leave only the previous post.
-            try:
-                queryset = Post.objects.active().exclude(id__exact=self.id)
-                post = queryset.filter(
-                    publish_date__gte=self.publish_date).order_by('publish_date')[0]
-            except (Post.DoesNotExist, IndexError):
-                post = None
-            self._next = post
-
-        return self._next
+        # Links skip drafts but include scheduled posts. If the next
+        # post is scheduled, every later post is too.
+        post = self.get_neighbours()[1]
+        if post is None or post.publish_date > active_now():
+            return None
+        return post
 
     def get_previous_post(self):
         """
         Returns the previous active post.
 
         """
-        if not self._previous:
-            try:
-                queryset = Post.objects.active().exclude(id__exact=self.id)
-                post = queryset.filter(
-                    publish_date__lte=self.publish_date).order_by('-publish_date')[0]
-            except (Post.DoesNotExist, IndexError):
-                post = None
-            self._previous = post
-
-        return self._previous
+        post = self.get_neighbours()[0]
+        if post is None or post.publish_date > active_now():
+            return None
+        return post
 
     class Meta:
         ordering = ('-publish_date', 'title')
         get_latest_by = 'publish_date'
+        # PostManager.active() and the (year, slug) detail lookup
+        index_together = [['draft_mode', 'publish_date'],
+                          ['slug', 'publish_date']]
 
 
 
-class Page(models.Model):
+class Page(RenderPipelineMixin, models.Model):
     """
     A model that stores data related to a single webpage.
 
@@ -245,7 +781,7 @@ class Page(models.Model):
     title = models.CharField(max_length=250)
     created = models.DateTimeField(auto_now_add=True, editable=False)
     modified = models.DateTimeField(auto_now=True, editable=False)
-    publish_date = models.DateTimeField(default=datetime.utcnow().replace(tzinfo=utc),
+    publish_date = models.DateTimeField(default=timezone.now,
                                         help_text=('The date and time this \
                                             article will be published.'))
     content = models.TextField()
@@ -269,12 +805,20 @@ class Page(models.Model):
                                      help_text='Pages in draft-mode will not \
                                      appear to regular users.')
     author = models.ForeignKey(User, related_name="pages")
+    render_version = models.CharField(max_length=64, blank=True,
+                                      editable=False)
+    render_pending = models.BooleanField(default=False, db_index=True,
+                                         editable=False)
+    render_attempts = models.PositiveSmallIntegerField(default=0,
+                                                       editable=False)
+    render_after = models.DateTimeField(null=True, blank=True, editable=False)
 
     # attach our custom manager
     objects = PostManager()
 
     def __init__(self, *args, **kwargs):
         super(Page, self).__init__(*args, **kwargs)
+        self.snapshot()
 
     def __unicode__(self):
         return self.title
@@ -284,39 +828,11 @@ class Page(models.Model):
         Call required methods before saving.
 
         """
-        self.render_content()
-        self.meta_description()
-
+        update_fields = self.prepare_render(kwargs.get('update_fields'))
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
         super(Page, self).save(*args, **kwargs)
-
-    def render_content(self):
-        """
-        Use markdown2 to render post.rendered_content from post.content.
-
-        """
-        if self.html_mode == False:
-            self.rendered_content = render_markup(self.content)
-        else:
-            self.rendered_content = self.content
-        return self.rendered_content
-
-    def meta_description(self):
-        """
-        If the meta-description is empty, create it from post.content.
-        First render the markdown, strip any html tags, then truncate
-        the text to 25 words.
-
-        """
-
-        if len(self.description.strip()) == 0:
-            # remove extra html tags from the description
-            d = strip_tags(render_markup(self.content))
-            self.description = Truncator(d).words(
-                    25,
-                    html=True,
-                    truncate=' ...'
-            )
-        return
+        self.finish_render()
 
     @models.permalink
     def get_absolute_url(self):
@@ -327,3 +843,103 @@ class Page(models.Model):
     class Meta:
         ordering = ('-publish_date', 'title')
         get_latest_by = 'publish_date'
+        index_together = [['draft_mode', 'publish_date']]
+
+
+class SearchEntry(models.Model):
+    """
+    One term of the full-text search index: the weight of a stemmed
+    `term` in a post or page. See `search`.
+
+    """
+    KIND_CHOICES = (('post', 'Post'), ('page', 'Page'))
+
+    kind = models.CharField(max_length=4, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name_plural = 'search entries'
+        index_together = [['term', 'kind', 'object_id'],
+                          ['kind', 'object_id']]
+
+
+def unlink_post(sender, instance, **kwargs):
+    """Join the neighbours of a deleted post to each other."""
+    Post.objects.relink([instance.previous_post_id, instance.next_post_id])
+
+post_delete.connect(unlink_post, sender=Post)
+
+
+def remember_tags(sender, instance, **kwargs):
+    """Tag links are gone by post_delete, so note them beforehand."""
+    instance._tag_pks = list(instance.tags.values_list('pk', flat=True))
+
+def count_deleted_post(sender, instance, **kwargs):
+    events.emit('tag_counts', *getattr(instance, '_tag_pks', []))
+
+def count_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep `Tag.active_post_count` in step with the post/tag relation."""
+    if action == 'pre_clear':
+        if reverse:
+            instance._tag_pks = [instance.pk]
+        else:
+            instance._tag_pks = list(instance.tags.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        events.emit('tag_counts', *instance.__dict__.pop('_tag_pks', []))
+    elif action in ('post_add', 'post_remove'):
+        events.emit('tag_counts', *([instance.pk] if reverse else pk_set))
+
+def count_archive_month(sender, instance, **kwargs):
+    events.emit('archive_months', utc_month(instance.publish_date))
+
+pre_delete.connect(remember_tags, sender=Post)
+post_delete.connect(count_archive_month, sender=Post)
+post_delete.connect(count_deleted_post, sender=Post)
+m2m_changed.connect(count_tagged_posts, sender=Post.tags.through)
+
+for model in (Post, Tag):
+    post_save.connect(caching.tag_list_changed, sender=model)
+    post_delete.connect(caching.tag_list_changed, sender=model)
+m2m_changed.connect(caching.tag_list_changed, sender=Post.tags.through)
+
+for model in (Post, Page, Tag):
+    post_save.connect(caching.invalidate_saved, sender=model)
+    post_delete.connect(caching.invalidate_saved, sender=model)
+m2m_changed.connect(caching.invalidate_tagged, sender=Post.tags.through)
+
+for model in (Post, Page):
+    post_save.connect(search.index_saved, sender=model)
+    post_delete.connect(search.unindex_deleted, sender=model)
+
+# Counters and the index first, the caches showing them last.
+events.subscribe('tag_counts', Tag.objects.update_counts)
+events.subscribe('archive_months', ArchiveMonth.objects.update_months)
+events.subscribe('search', search.reindex)
+events.subscribe('tag_list', lambda keys: caching.invalidate_tag_list())
+events.subscribe('pages', lambda groups: caching.invalidate_pages(*groups))
+
+
+def touch_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Tags are shown with their posts, so changing a post's tags counts as
+    an edit of the post. This keeps `modified` usable as a validator.
+
+    """
+    if action == 'pre_clear' and reverse:
+        pks = list(instance.post_set.values_list('pk', flat=True))
+    elif action == 'post_clear' and not reverse:
+        pks = [instance.pk]
+    elif action in ('post_add', 'post_remove'):
+        pks = pk_set if reverse else [instance.pk]
+    else:
+        return
+    Post.objects.filter(pk__in=pks).update(modified=timezone.now())
+
+def touch_posts_of_tag(sender, instance, **kwargs):
+    Post.objects.filter(tags=instance).update(modified=timezone.now())
+
+m2m_changed.connect(touch_tagged_posts, sender=Post.tags.through)
+post_save.connect(touch_posts_of_tag, sender=Tag)
+pre_delete.connect(touch_posts_of_tag, sender=Tag)
@@ -0,0 +1,135 @@
+"""
+Paginators for Post lists.
+
+`CachedCountPaginator` is a regular page number paginator whose COUNT
+query is cached. `KeysetPaginator` pages through posts with a cursor on
+(publish_date, id), so it needs no COUNT and no OFFSET at all.
+
+"""
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.timezone import utc
+
+from calendar import timegm
+from datetime import datetime, timedelta
+
+from . import caching
+
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    A Paginator that caches the object count in the page cache group
+    `count_group`, so it is dropped whenever those pages are.
+
+    """
+    def __init__(self, object_list, per_page, count_group=None, **kwargs):
+        super(CachedCountPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.count_group = count_group
+
+    def _get_count(self):
+        if self._count is None:
+            if self.count_group is None:
+                return super(CachedCountPaginator, self)._get_count()
+            self._count = caching.cached_count(self.object_list,
+                                               self.count_group)
+        return self._count
+    count = property(_get_count)
+
+
+def encode_cursor(post):
+    """Returns a url safe cursor for the position of `post`."""
+    date = post.publish_date
+    micros = timegm(date.utctimetuple()) * 10 ** 6 + date.microsecond
+    return '%d_%d' % (micros, post.pk)
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = [int(bit) for bit in cursor.split('_')]
+    except (ValueError, AttributeError):
+        raise Http404('Invalid page cursor.')
+    return EPOCH + timedelta(microseconds=micros), pk
+
+
+class KeysetPage(object):
+    """
+    A page of a KeysetPaginator. It has the parts of the Page api that
+    make sense without a count, plus the cursors to the next and previous
+    pages.
+
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+
+
+class KeysetPaginator(object):
+    """
+    Pages through posts newest first, ordered by (publish_date, id).
+
+    """
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def page(self, after=None, before=None):
+        """
+        Returns the page of posts older than the `after` cursor, or newer
+        than the `before` cursor, or the first page if neither is given.
+
+        """
+        queryset = self.object_list
+        if before:
+            date, pk = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(publish_date__gt=date) | Q(publish_date=date, pk__gt=pk)
+                ).order_by('publish_date', 'pk')
+        else:
+            if after:
+                date, pk = decode_cursor(after)
+                queryset = queryset.filter(
+                    Q(publish_date__lt=date) | Q(publish_date=date, pk__lt=pk))
+            queryset = queryset.order_by('-publish_date', '-pk')
+
+        objects = list(queryset[:self.per_page + 1])
+        more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if before:
+            objects.reverse()
+            return KeysetPage(objects, True, more, self)
+        return KeysetPage(objects, more, bool(after), self)
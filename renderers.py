@@ -0,0 +1,284 @@
+"""
+Markup renderers used to turn Post and Page source text into html.
+
+The active backend is selected with the ``GINYU_RENDERER`` setting. It may
+be one of the built-in names ('local' or 'github') or a dotted path to a
+renderer class. The local renderer is the default.
+
+Rendered html is cached by a hash of the source text, the renderer and
+its version. See `RenderCache`.
+
+"""
+from django.conf import settings
+from django.core.cache import get_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.encoding import force_bytes
+from django.utils.importlib import import_module
+
+from collections import OrderedDict
+import hashlib
+import json
+import re
+import threading
+
+import markdown
+
+from .metrics import count_cache, timer
+
+
+class BaseRenderer(object):
+    """
+    Base class for markup renderers.
+
+    Subclasses must implement `render()`. `version` should change
+    whenever the html a renderer produces for the same text changes.
+
+    """
+    name = None
+    version = '1'
+
+    def render(self, text):
+        raise NotImplementedError
+
+
+class LocalRenderer(BaseRenderer):
+    """
+    Renders GitHub flavored markdown in-process.
+
+    Supports fenced code, tables, autolinks and hard line breaks. Code
+    blocks are highlighted with Pygments using the `highlight` css class,
+    so any of the themes in `static/css/` can be used.
+
+    """
+    name = 'local'
+    version = 'local-1'
+
+    extensions = [
+        'markdown.extensions.fenced_code',
+        'markdown.extensions.codehilite',
+        'markdown.extensions.tables',
+        'markdown.extensions.nl2br',
+        'markdown.extensions.sane_lists',
+    ]
+    extension_configs = {
+        'markdown.extensions.codehilite': {
+            'css_class': 'highlight',
+            'guess_lang': False,
+        },
+    }
+
+    # Bare urls are linked unless they are already inside one of these.
+    skip_tags = ('a', 'code', 'pre')
+    tag_re = re.compile(r'<(/?)(\w+)[^>]*>')
+    url_re = re.compile(r'(?<![\w/"\'=])((?:https?://|www\.)[^\s<]*[^\s<.,:;"\')\]!?])')
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get_markdown(self):
+        """Markdown instances are not thread safe, keep one per thread."""
+        md = getattr(self._local, 'md', None)
+        if md is None:
+            md = markdown.Markdown(extensions=self.extensions,
+                                   extension_configs=self.extension_configs,
+                                   output_format='html5')
+            self._local.md = md
+        return md.reset()
+
+    def render(self, text):
+        return self.autolink(self.get_markdown().convert(text))
+
+    def autolink(self, html):
+        """Wrap bare urls found in text nodes with anchor tags."""
+        bits, depth, pos = [], 0, 0
+        for tag in self.tag_re.finditer(html):
+            bits.append(self.link_text(html[pos:tag.start()], depth))
+            bits.append(tag.group(0))
+            if tag.group(2).lower() in self.skip_tags:
+                depth += -1 if tag.group(1) else 1
+            pos = tag.end()
+        bits.append(self.link_text(html[pos:], depth))
+        return ''.join(bits)
+
+    def link_text(self, text, depth):
+        if depth > 0 or not text:
+            return text
+        return self.url_re.sub(self._link, text)
+
+    def _link(self, match):
+        url = match.group(1)
+        href = url if '://' in url else 'http://' + url
+        return '<a href="%s">%s</a>' % (href, url)
+
+
+class GitHubRenderer(BaseRenderer):
+    """
+    Uses the github api to return html markup.
+
+    Every call is a blocking http request, so this backend is opt-in.
+
+    """
+    name = 'github'
+    version = 'github-gfm-1'
+
+    url = 'https://api.github.com/markdown'
+
+    def __init__(self):
+        try:
+            import requests
+        except ImportError:
+            raise ImproperlyConfigured(
+                "GINYU_RENDERER 'github' requires the requests package.")
+        self.requests = requests
+
+    def render(self, text):
+        headers = {'content-type': 'application/json'}
+
+        context = {
+            "text": text,
+            "mode": "gfm",
+            "context": getattr(settings, 'GINYU_GITHUB_CONTEXT', 'github/sawboo'),
+        }
+
+        timeout = getattr(settings, 'GINYU_GITHUB_TIMEOUT', 10)
+        r = self.requests.post(self.url, data=json.dumps(context),
+                               headers=headers, timeout=timeout)
+        r.raise_for_status()
+
+        return r.text
+
+
+RENDERERS = {
+    'local': LocalRenderer,
+    'github': GitHubRenderer,
+}
+
+_renderers = {}
+
+
+def get_renderer(name=None):
+    """
+    Returns a renderer instance by name or dotted path. Defaults to the
+    `GINYU_RENDERER` setting.
+
+    """
+    name = name or getattr(settings, 'GINYU_RENDERER', 'local')
+    if name not in _renderers:
+        if name in RENDERERS:
+            cls = RENDERERS[name]
+        else:
+            module, _, attr = name.rpartition('.')
+            try:
+                cls = getattr(import_module(module), attr)
+            except (ImportError, AttributeError, ValueError):
+                raise ImproperlyConfigured(
+                    'GINYU_RENDERER %r is not a known renderer.' % name)
+        _renderers[name] = cls()
+    return _renderers[name]
+
+
+# A timeout of None means the backend's default, 300 seconds, in Django 1.5.
+RENDER_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+class RenderCache(object):
+    """
+    A two tier, content addressed cache for rendered markup.
+
+    The first tier is an in-process LRU holding `GINYU_RENDER_CACHE_SIZE`
+    entries. The second is the Django cache named by `GINYU_RENDER_CACHE`
+    (set it to None to disable), which is bounded by that backend's own
+    `MAX_ENTRIES` culling. Its entries are kept for
+    `GINYU_RENDER_CACHE_TIMEOUT` seconds, 30 days by default; the keys
+    change with the text, so they never go stale. Hits and misses are
+    counted in `stats`.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._backend = None
+        self.stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0}
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'GINYU_RENDER_CACHE_SIZE', 256)
+
+    @property
+    def backend(self):
+        alias = getattr(settings, 'GINYU_RENDER_CACHE', 'default')
+        if not alias:
+            return None
+        if self._backend is None or self._backend[0] != alias:
+            self._backend = (alias, get_cache(alias))
+        return self._backend[1]
+
+    def make_key(self, text, renderer):
+        digest = hashlib.sha1(force_bytes(text)).hexdigest()
+        return 'ginyu:markup:%s:%s:%s' % (renderer.name, renderer.version, digest)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                html = self._entries.pop(key)
+                self._entries[key] = html
+                self.stats['memory_hits'] += 1
+                return html
+
+        backend = self.backend
+        html = backend.get(key) if backend is not None else None
+        with self._lock:
+            if html is None:
+                self.stats['misses'] += 1
+            else:
+                self.stats['persistent_hits'] += 1
+        if html is not None:
+            self._remember(key, html)
+        return html
+
+    def set(self, key, html):
+        self._remember(key, html)
+        backend = self.backend
+        if backend is not None:
+            backend.set(key, html, getattr(
+                settings, 'GINYU_RENDER_CACHE_TIMEOUT', RENDER_CACHE_TIMEOUT))
+
+    def _remember(self, key, html):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = html
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Empties the in-process tier and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            for k in self.stats:
+                self.stats[k] = 0
+
+
+render_cache = RenderCache()
+
+
+def render_markup(text, renderer=None, cache=True):
+    """
+    Returns html markup for the given markdown text.
+
+    Identical text is only rendered once per renderer version unless
+    `cache` is False.
+
+    """
+    renderer = get_renderer(renderer)
+    if not cache:
+        with timer('markup'):
+            return renderer.render(text)
+
+    key = render_cache.make_key(text, renderer)
+    html = render_cache.get(key)
+    count_cache('markup', html is not None)
+    if html is None:
+        with timer('markup'):
+            html = renderer.render(text)
+        render_cache.set(key, html)
+    return html
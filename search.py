@@ -0,0 +1,261 @@
+"""
+Full-text search over posts and pages.
+
+Text is split into words, lowercased, stripped of stop words and stemmed,
+and every resulting term is stored with its weight in a `SearchEntry`
+row. Finding the documents that contain a term is then an index lookup
+instead of a LIKE scan over the content columns.
+
+Documents are reindexed through `events` whenever their title,
+description or content changes, once per batch. Use
+`manage.py ginyu_reindex` to build the index for existing rows.
+
+"""
+from django.db.models import Count, Q, Sum
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+import math
+import re
+
+from . import events
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+STOP_WORDS = frozenset((
+    'a an and are as at be but by for from has have he her his i if in '
+    'into is it its me my no not of on or our she so than that the their '
+    'them then there these they this to was we were what when which who '
+    'will with you your').split())
+
+# Occurrences in the title count for more than those in the body.
+FIELD_WEIGHTS = (('title', 5), ('description', 2), ('content', 1))
+
+MAX_TERM_LENGTH = 64
+
+
+def has_vowel(word):
+    return bool(re.search('[aeiouy]', word))
+
+
+# (suffix, replacement) pairs, tried in order, the first match wins.
+SUFFIXES = (
+    ('ational', 'ate'), ('tional', 'tion'), ('ization', 'ize'),
+    ('fulness', 'ful'), ('ousness', 'ous'), ('iveness', 'ive'),
+    ('ation', 'ate'), ('ness', ''), ('ment', ''), ('able', ''),
+    ('ible', ''), ('ful', ''), ('ly', ''),
+)
+
+
+def stem(word):
+    """
+    A small suffix-stripping stemmer in the spirit of Porter's: plurals,
+    -ed and -ing endings and a handful of derivational suffixes are
+    removed, so 'rendering', 'rendered' and 'renders' all become
+    'render'. Short words are left alone.
+
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+
+    for suffix in ('ing', 'ed'):
+        base = word[:-len(suffix)]
+        if word.endswith(suffix) and len(base) > 2 and has_vowel(base):
+            word = base
+            if word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            elif word.endswith(('at', 'bl', 'iz')):
+                word += 'e'
+            break
+
+    for suffix, replacement in SUFFIXES:
+        base = word[:-len(suffix)]
+        if word.endswith(suffix) and len(base) > 2 and has_vowel(base):
+            return base + replacement
+    if word.endswith('y') and has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+    elif word.endswith('e') and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    """Returns the stemmed terms of `text`, in order."""
+    return [stem(w)[:MAX_TERM_LENGTH] for w in WORD_RE.findall(text.lower())
+            if w not in STOP_WORDS]
+
+
+def document_terms(obj):
+    """
+    Returns a {term: weight} dict for a post or page. Weights are the
+    field weighted term frequencies, scaled down for long documents so
+    a term in a short post outranks a passing mention in a long one.
+
+    """
+    counts, length = {}, 0
+    for field, weight in FIELD_WEIGHTS:
+        words = terms(strip_tags(getattr(obj, field)))
+        length += len(words)
+        for term in words:
+            counts[term] = counts.get(term, 0) + weight
+    norm = math.sqrt(length or 1)
+    return dict((term, max(1, int(round(100 * count / norm))))
+                for term, count in counts.items())
+
+
+def kind_of(model):
+    return model.__name__.lower()
+
+
+def index(obj):
+    """Replaces the index entries of `obj`."""
+    from .models import SearchEntry
+
+    kind = kind_of(type(obj))
+    unindex(obj)
+    SearchEntry.objects.bulk_create([
+        SearchEntry(kind=kind, object_id=obj.pk, term=term, weight=weight)
+        for term, weight in document_terms(obj).items()])
+
+
+def unindex(obj):
+    from .models import SearchEntry
+
+    SearchEntry.objects.filter(kind=kind_of(type(obj)),
+                               object_id=obj.pk).delete()
+
+
+def reindex(keys):
+    """
+    Indexes the documents of the given (kind, object_id) pairs, and drops
+    the entries of those that no longer exist.
+
+    """
+    from .models import Post, Page, SearchEntry
+
+    for model in (Post, Page):
+        kind = kind_of(model)
+        pks = set(pk for k, pk in keys if k == kind)
+        if not pks:
+            continue
+        found = set()
+        for obj in model.objects.filter(pk__in=pks):
+            index(obj)
+            found.add(obj.pk)
+        if pks - found:
+            SearchEntry.objects.filter(kind=kind,
+                                       object_id__in=pks - found).delete()
+
+
+def index_saved(sender, instance, created=False, **kwargs):
+    """post_save receiver for Post and Page."""
+    if created or any(instance.has_changed(f) for f, w in FIELD_WEIGHTS):
+        events.emit('search', (kind_of(sender), instance.pk))
+
+
+def unindex_deleted(sender, instance, **kwargs):
+    """post_delete receiver for Post and Page."""
+    events.emit('search', (kind_of(sender), instance.pk))
+
+
+def matching(query, models=None, active=True):
+    """
+    Returns (kind, object_id, score) rows of the documents that contain
+    every term of `query`, best first. Only published documents are
+    included when `active` is set.
+
+    """
+    from .models import Post, Page, SearchEntry
+
+    wanted = set(terms(query))
+    if not wanted:
+        return SearchEntry.objects.none().values('kind', 'object_id')
+
+    documents = Q()
+    for model in models or (Post, Page):
+        q = Q(kind=kind_of(model))
+        if active:
+            q &= Q(object_id__in=model.objects.active().values('pk'))
+        documents |= q
+
+    return (SearchEntry.objects.filter(documents, term__in=wanted)
+            .values('kind', 'object_id')
+            .annotate(matched=Count('term'), score=Sum('weight'))
+            .filter(matched=len(wanted))
+            .order_by('-score', '-object_id'))
+
+
+def filter_queryset(queryset, query):
+    """
+    Narrows `queryset` down to the objects containing every term of
+    `query`. Used by the admin, so drafts are included.
+
+    """
+    from .models import SearchEntry
+
+    kind = kind_of(queryset.model)
+    for term in set(terms(query)):
+        queryset = queryset.filter(pk__in=SearchEntry.objects.filter(
+            kind=kind, term=term).values('object_id'))
+    return queryset
+
+
+def load(rows, query):
+    """
+    Returns the posts and pages for `rows` from `matching()`, in the
+    same order, each with a highlighted `snippet` and its `score`.
+
+    """
+    from .models import Post, Page
+
+    rows = list(rows)
+    objects = {}
+    for model in (Post, Page):
+        kind = kind_of(model)
+        pks = [r['object_id'] for r in rows if r['kind'] == kind]
+        if pks:
+            for obj in model.objects.filter(pk__in=pks).defer('content'):
+                objects[kind, obj.pk] = obj
+
+    wanted = set(terms(query))
+    results = []
+    for row in rows:
+        obj = objects.get((row['kind'], row['object_id']))
+        if obj is not None:
+            obj.score = row['score']
+            obj.snippet = highlight(strip_tags(obj.rendered_content), wanted)
+            results.append(obj)
+    return results
+
+
+def highlight(text, wanted, size=30):
+    """
+    Returns `size` words of `text` around the first word matching one of
+    the `wanted` terms, with the matches wrapped in <mark> tags.
+
+    """
+    words = text.split()
+    start = 0
+    for i, word in enumerate(words):
+        if set(terms(word)) & wanted:
+            start = max(0, i - size // 3)
+            break
+
+    bits = []
+    for word in words[start:start + size]:
+        if set(terms(word)) & wanted:
+            bits.append('<mark>%s</mark>' % escape(word))
+        else:
+            bits.append(escape(word))
+    snippet = ' '.join(bits)
+    if start > 0:
+        snippet = '... ' + snippet
+    if start + size < len(words):
+        snippet += ' ...'
+    return mark_safe(snippet)
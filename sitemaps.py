@@ -0,0 +1,122 @@
+"""
+Sitemaps of the active posts, pages and tags.
+
+Each section is split into chunks by ranges of `GINYU_SITEMAP_SIZE` ids,
+so a chunk never grows past the protocol's limit and an edit only
+changes the chunk its object falls in. Chunks are listed by a sitemap
+index and cached in the page cache group of their id range, see
+`caching.sitemap_group`.
+
+"""
+from django.core.urlresolvers import reverse
+from django.db.models import Max, Min
+from django.shortcuts import render_to_response
+from django.http import Http404
+
+from .caching import cache_page_groups, sitemap_size
+from .models import Post, Page, Tag
+
+
+class ChunkedSitemap(object):
+    changefreq = None
+    priority = None
+
+    def items(self):
+        raise NotImplementedError
+
+    def chunks(self):
+        """Returns the numbers of the chunks that may hold items."""
+        bounds = self.items().aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return []
+        size = sitemap_size()
+        return range(bounds['first'] // size, bounds['last'] // size + 1)
+
+    def chunk(self, number):
+        size = sitemap_size()
+        return self.items().filter(pk__gte=number * size,
+                                   pk__lt=(number + 1) * size).order_by('pk')
+
+    def chunk_lastmod(self, number):
+        return self.chunk(number).aggregate(
+            lastmod=Max('modified'))['lastmod']
+
+    def location(self, obj):
+        return obj.get_absolute_url()
+
+    def lastmod(self, obj):
+        return obj.modified
+
+    def get_urls(self, number, request):
+        for obj in self.chunk(number):
+            yield {
+                'location': request.build_absolute_uri(self.location(obj)),
+                'lastmod': self.lastmod(obj),
+                'changefreq': self.changefreq,
+                'priority': self.priority,
+            }
+
+
+class PostSitemap(ChunkedSitemap):
+    changefreq = 'monthly'
+
+    def items(self):
+        return Post.objects.active().only('slug', 'publish_date', 'modified')
+
+
+class PageSitemap(ChunkedSitemap):
+    changefreq = 'monthly'
+
+    def items(self):
+        return Page.objects.active().only('slug', 'modified')
+
+
+class TagSitemap(ChunkedSitemap):
+    """Tags with active posts. They change when one of their posts does."""
+    changefreq = 'weekly'
+
+    def items(self):
+        return Tag.objects.filter(active_post_count__gt=0)
+
+    def chunk(self, number):
+        return super(TagSitemap, self).chunk(number).annotate(
+            lastmod=Max('post__modified'))
+
+    def chunk_lastmod(self, number):
+        return super(TagSitemap, self).chunk(number).aggregate(
+            lastmod=Max('post__modified'))['lastmod']
+
+    def lastmod(self, obj):
+        return obj.lastmod
+
+
+SITEMAPS = (
+    ('posts', PostSitemap()),
+    ('pages', PageSitemap()),
+    ('tags', TagSitemap()),
+)
+
+
+@cache_page_groups(['sitemap'])
+def sitemap_index(request):
+    """Lists every sitemap chunk with the last change of its items."""
+    sitemaps = []
+    for section, sitemap in SITEMAPS:
+        for number in sitemap.chunks():
+            url = reverse('ginyu_sitemap', kwargs={'section': section,
+                                                   'chunk': number})
+            sitemaps.append({'location': request.build_absolute_uri(url),
+                             'lastmod': sitemap.chunk_lastmod(number)})
+    return render_to_response('ginyu_sitemap_index.xml', {'sitemaps': sitemaps},
+                              content_type='application/xml')
+
+
+@cache_page_groups(['sitemap:%(section)s:%(chunk)s'])
+def sitemap(request, section, chunk):
+    """A single chunk of a section."""
+    sitemaps = dict(SITEMAPS)
+    if section not in sitemaps:
+        raise Http404('No sitemap section %r.' % section)
+    urls = sitemaps[section].get_urls(int(chunk), request)
+    return render_to_response('ginyu_sitemap.xml', {'urlset': urls},
+                              content_type='application/xml')
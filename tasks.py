@@ -0,0 +1,199 @@
+"""
+Background rendering for Post and Page objects.
+
+`GINYU_RENDER_MODE` controls how markup is rendered when an object is
+saved:
+
+- 'sync' (default) renders inside `save()`.
+- 'thread' stores the source fields, marks the row `render_pending` and
+  renders it on an in-process thread pool. Jobs live in memory, so rows
+  left pending when the process exits are only rendered again by
+  `ginyu_render_worker` or their next save.
+- 'queue' only marks the row; the `ginyu_render_worker` management command
+  polls for pending rows and renders them.
+
+Failed renders are retried with exponential backoff until
+`GINYU_RENDER_MAX_ATTEMPTS` is reached.
+
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from datetime import timedelta
+import logging
+import threading
+
+from . import caching, events, search
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+logger = logging.getLogger(__name__)
+
+
+def render_mode():
+    return getattr(settings, 'GINYU_RENDER_MODE', 'sync')
+
+
+def is_async():
+    return render_mode() != 'sync'
+
+
+def max_attempts():
+    return getattr(settings, 'GINYU_RENDER_MAX_ATTEMPTS', 5)
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after `attempts` failures."""
+    base = getattr(settings, 'GINYU_RENDER_BACKOFF', 30)
+    return base * 2 ** (attempts - 1)
+
+
+def pending(model, now=None):
+    """Returns a queryset of `model` rows that are due to be rendered."""
+    now = now or timezone.now()
+    return model.objects.filter(
+        render_pending=True, render_attempts__lt=max_attempts()).filter(
+        Q(render_after__isnull=True) | Q(render_after__lte=now))
+
+
+def render_object(model, pk):
+    """
+    Render a single pending object and write the html fields back.
+
+    Returns True if the object was rendered. The update is skipped if the
+    row was saved again while rendering, the newer save has queued its
+    own render.
+
+    """
+    try:
+        obj = pending(model).get(pk=pk)
+    except model.DoesNotExist:
+        return False
+
+    try:
+        obj.render(force=True)
+    except Exception:
+        attempts = obj.render_attempts + 1
+        logger.exception('Rendering %s %s failed (attempt %d)',
+                         model.__name__, pk, attempts)
+        model.objects.filter(pk=pk, modified=obj.modified).update(
+            render_attempts=attempts,
+            render_after=timezone.now() + timedelta(seconds=backoff(attempts)))
+        return False
+
+    fields = dict((f, getattr(obj, f)) for f in obj.rendered_fields)
+    with events.batch():
+        # the new html is a change of the row, for validators and caches
+        updated = model.objects.filter(pk=pk, modified=obj.modified).update(
+            render_pending=False, render_attempts=0, render_after=None,
+            modified=timezone.now(), **fields)
+        if updated:
+            rendered(model, [pk])
+    return bool(updated)
+
+
+def rendered(model, pks):
+    """Drops the cached pages and index entries of freshly rendered rows."""
+    events.emit('pages', *caching.bulk_groups(model, pks))
+    events.emit('search', *[(search.kind_of(model), pk) for pk in pks])
+
+
+def process_pending(limit=None):
+    """
+    Render every object that is due. This is also the synchronous
+    fallback used by tests. Returns the number of rendered objects.
+
+    """
+    from .models import Post, Page
+
+    count = 0
+    for model in (Post, Page):
+        pks = pending(model).order_by('pk').values_list('pk', flat=True)
+        if limit is not None:
+            pks = pks[:max(limit - count, 0)]
+        for pk in list(pks):
+            if render_object(model, pk):
+                count += 1
+    return count
+
+
+class RenderPool(object):
+    """
+    A small pool of daemon threads that render queued objects.
+
+    A failed render is submitted again once its backoff has passed. The
+    row may not be visible yet when a job runs (the admin saves inside a
+    transaction), so missing rows are retried `retries` times, about 30
+    seconds in all, before the job is dropped and left for
+    `process_pending`.
+
+    """
+    retries = 6
+
+    def __init__(self, size):
+        self.queue = Queue()
+        for i in range(size):
+            t = threading.Thread(target=self.work,
+                                 name='ginyu-render-%d' % i)
+            t.daemon = True
+            t.start()
+
+    def submit(self, model, pk, missing=0, delay=0):
+        """Queues a job, after `delay` seconds if given."""
+        if delay > 0:
+            timer = threading.Timer(delay, self.queue.put,
+                                    [(model, pk, missing)])
+            timer.daemon = True
+            timer.start()
+        else:
+            self.queue.put((model, pk, missing))
+
+    def run(self, model, pk, missing=0):
+        """Renders a job, submitting it again if the row is not done."""
+        if render_object(model, pk):
+            return
+        rows = model.objects.filter(
+            pk=pk, render_pending=True, render_attempts__lt=max_attempts()
+            ).values_list('render_after', flat=True)[:1]
+        if rows:
+            # failed, or saved again meanwhile, which queued its own job
+            if rows[0] is not None:
+                delay = (rows[0] - timezone.now()).total_seconds()
+                self.submit(model, pk, delay=max(delay, 0.1))
+        elif missing < self.retries:
+            self.submit(model, pk, missing + 1, delay=0.5 * 2 ** missing)
+
+    def work(self):
+        while True:
+            model, pk, missing = self.queue.get()
+            try:
+                self.run(model, pk, missing)
+            except Exception:
+                logger.exception('Render worker failed on %s %s',
+                                 model.__name__, pk)
+            finally:
+                connection.close()
+                self.queue.task_done()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool(getattr(settings, 'GINYU_RENDER_THREADS', 2))
+    return _pool
+
+
+def enqueue(obj):
+    """Schedule a pending object for rendering."""
+    if render_mode() == 'thread':
+        get_pool().submit(obj.__class__, obj.pk)
@@ -5,7 +5,38 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+from datetime import datetime, timedelta
+import json
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.conf.urls import include, patterns, url
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import connection, reset_queries
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.unittest import skipUnless
+
+from .models import ArchiveMonth, Page, Post, SearchEntry, Tag, active_now
+from .paginators import KeysetPaginator
+from .caching import (LazyTagList, cached_active, cached_authors,
+                      get_generations, invalidate_pages, invalidate_tag_list)
+from .feeds import ArchiveFeed
+from .metrics import aggregate
+from .renderers import (BaseRenderer, get_renderer, render_cache,
+                        render_markup)
+from . import admin as ginyu_admin  # registers the model admins
+from . import events, search
+from .tasks import RenderPool, process_pending
+from .management.commands.ginyu_rerender import Command as RerenderCommand
 
 
 class SimpleTest(TestCase):
@@ -14,3 +45,988 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+PARITY_SAMPLES = [
+    "Some *emphasis*, **strong** text and a [link](http://example.com).",
+    "A bare url http://example.com/path in a sentence.",
+    "first line\nsecond line",
+    "```python\ndef hello():\n    return 'world'\n```",
+    "| a | b |\n|---|---|\n| 1 | 2 |",
+    "1. one\n2. two\n\n- three\n- four",
+    "> quoted `code`",
+]
+
+
+def normalize(html):
+    """Reduce html to its tag structure and text so renderers can be compared."""
+    tags = re.findall(r'<(\w+)', html)
+    tags = [t for t in tags if t not in ('span', 'div', 'code')]
+    text = ' '.join(strip_tags(html).split())
+    return tags, text
+
+
+class LocalRendererTest(TestCase):
+    def test_fenced_code_is_highlighted(self):
+        html = render_markup("```python\nimport os\n```", renderer='local')
+        self.assertIn('class="highlight"', html)
+        self.assertIn('<span class="kn">import</span>', html)
+
+    def test_tables(self):
+        html = render_markup("| a | b |\n|---|---|\n| 1 | 2 |", renderer='local')
+        self.assertIn('<table>', html)
+        self.assertIn('<td>2</td>', html)
+
+    def test_autolinks_skip_code(self):
+        html = render_markup("see http://example.com and `http://a.com`",
+                             renderer='local')
+        self.assertIn('<a href="http://example.com">http://example.com</a>', html)
+        self.assertIn('<code>http://a.com</code>', html)
+
+
+@skipUnless(os.environ.get('GINYU_PARITY_TESTS'),
+            'set GINYU_PARITY_TESTS to compare against the github api')
+class RendererParityTest(TestCase):
+    def test_local_matches_github(self):
+        local, github = get_renderer('local'), get_renderer('github')
+        for text in PARITY_SAMPLES:
+            self.assertEqual(normalize(local.render(text)),
+                             normalize(github.render(text)), text)
+
+
+class RenderCacheTest(TestCase):
+    def setUp(self):
+        render_cache.clear()
+
+    def test_identical_text_is_rendered_once(self):
+        renderer = get_renderer('local')
+        calls = []
+        original = renderer.render
+        renderer.render = lambda text: calls.append(text) or original(text)
+        try:
+            first = render_markup('cached *text*', renderer='local')
+            second = render_markup('cached *text*', renderer='local')
+        finally:
+            del renderer.render
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(render_cache.stats['misses'], 1)
+        self.assertEqual(render_cache.stats['memory_hits'], 1)
+
+    def test_key_depends_on_renderer_version(self):
+        renderer = get_renderer('local')
+        key = render_cache.make_key('text', renderer)
+        renderer.version = 'local-test'
+        try:
+            self.assertNotEqual(key, render_cache.make_key('text', renderer))
+        finally:
+            del renderer.version
+
+
+class RenderPipelineTest(TestCase):
+    def setUp(self):
+        # the misses counted below must not depend on earlier tests
+        render_cache.clear()
+        if render_cache.backend is not None:
+            render_cache.backend.clear()
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+
+    def test_save_renders_content_once(self):
+        post = Post(title='Single pass', slug='single-pass',
+                    content='A *single* pass over the content.',
+                    author=self.author)
+        post.save()
+        self.assertEqual(render_cache.stats['misses'], 1)
+        self.assertEqual(render_cache.stats['memory_hits'], 0)
+        self.assertEqual(post.description, 'A single pass over the content.')
+        self.assertEqual(post.rendered_excerpt, post.rendered_content)
+
+    def test_changed_excerpt_is_rendered(self):
+        post = Post.objects.create(title='Excerpt', slug='excerpt',
+                                   content='content', author=self.author)
+        post = Post.objects.get(pk=post.pk)
+        self.assertFalse(post.has_changed('excerpt'))
+        post.excerpt = 'a *new* excerpt'
+        post.save()
+        self.assertIn('<em>new</em>', post.rendered_excerpt)
+        # only the excerpt was rendered
+        self.assertEqual(render_cache.stats['misses'], 2)
+
+    def test_metadata_save_renders_nothing(self):
+        post = Post.objects.create(title='Metadata', slug='metadata',
+                                   content='*content*', author=self.author)
+        post = Post.objects.get(pk=post.pk)
+        render_cache.clear()
+        post.title = 'Renamed'
+        post.draft_mode = True
+        post.description = 'Hand written.'
+        post.save()
+        self.assertEqual(sum(render_cache.stats.values()), 0)
+        self.assertEqual(Post.objects.get(pk=post.pk).description, 'Hand written.')
+
+    def test_update_fields(self):
+        post = Post.objects.create(title='Fields', slug='fields',
+                                   content='content', author=self.author)
+        post = Post.objects.get(pk=post.pk)
+        Post.objects.filter(pk=post.pk).update(content='edited elsewhere')
+        post.title = 'Renamed'
+        post.save(update_fields=['title'])
+        saved = Post.objects.get(pk=post.pk)
+        self.assertEqual((saved.title, saved.content),
+                         ('Renamed', 'edited elsewhere'))
+
+        post.content = '*rendered*'
+        post.save(update_fields=['content'])
+        saved = Post.objects.get(pk=post.pk)
+        self.assertIn('<em>rendered</em>', saved.rendered_content)
+
+
+@override_settings(GINYU_RENDER_MODE='queue')
+class BackgroundRenderTest(TestCase):
+    urls = __name__.rsplit('.', 1)[0] + '.urls'
+
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+
+    def test_save_defers_rendering(self):
+        post = Post.objects.create(title='Later', slug='later',
+                                   content='rendered *later*',
+                                   author=self.author)
+        self.assertTrue(post.render_pending)
+        self.assertEqual(post.rendered_content, '')
+
+        self.assertEqual(process_pending(), 1)
+        post = Post.objects.get(pk=post.pk)
+        self.assertFalse(post.render_pending)
+        self.assertIn('<em>later</em>', post.rendered_content)
+        self.assertEqual(post.rendered_excerpt, post.rendered_content)
+
+    @override_settings(GINYU_PAGE_CACHE=True)
+    def test_rendering_refreshes_cached_pages(self):
+        post = Post.objects.create(title='Later', slug='later',
+                                   content='rendered *later*',
+                                   author=self.author)
+        etag = self.client.get(post.get_absolute_url())['ETag']
+        process_pending()
+        response = self.client.get(post.get_absolute_url(),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '<em>later</em>')
+        self.assertTrue(search.matching('later'))
+
+    @override_settings(GINYU_RENDERER=__name__ + '.BrokenRenderer',
+                       GINYU_RENDER_BACKOFF=30)
+    def test_failed_thread_render_is_retried_after_backoff(self):
+        post = Post.objects.create(title='Broken', slug='broken',
+                                   content='never *rendered*',
+                                   author=self.author)
+        pool, submitted = RenderPool(0), []
+        pool.submit = lambda *args, **kwargs: submitted.append(kwargs)
+        pool.run(Post, post.pk)
+        post = Post.objects.get(pk=post.pk)
+        self.assertTrue(post.render_pending)
+        self.assertEqual(post.render_attempts, 1)
+        self.assertEqual(len(submitted), 1)
+        self.assertAlmostEqual(submitted[0]['delay'], 30, delta=5)
+
+
+class BrokenRenderer(BaseRenderer):
+    name = 'broken'
+    version = 'broken-1'
+
+    def render(self, text):
+        raise ValueError('broken renderer')
+
+
+class RerenderCommandTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+
+    def test_stale_rows_are_rerendered(self):
+        post = Post.objects.create(title='Stale', slug='stale',
+                                   content='*stale*', author=self.author)
+        Post.objects.filter(pk=post.pk).update(render_version='old',
+                                               rendered_content='')
+        call_command('ginyu_rerender', stale=True, verbosity=0,
+                     checkpoint=os.path.join(tempfile.mkdtemp(), 'rerender.json'))
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.render_version, get_renderer().version)
+        self.assertIn('<em>stale</em>', post.rendered_content)
+
+    def test_unchanged_rows_keep_their_validators(self):
+        post = Post.objects.create(title='Same', slug='same',
+                                   content='*same*', author=self.author)
+        modified = Post.objects.get(pk=post.pk).modified
+        call_command('ginyu_rerender', verbosity=0,
+                     checkpoint=os.path.join(tempfile.mkdtemp(), 'rerender.json'))
+        self.assertEqual(Post.objects.get(pk=post.pk).modified, modified)
+
+    def test_rows_saved_meanwhile_are_skipped(self):
+        post = Post.objects.create(title='Edited', slug='edited',
+                                   content='*new*', author=self.author)
+        stale = post.modified - timedelta(seconds=1)
+        changed = RerenderCommand().write(Post, [
+            (post.pk, stale, False, {'rendered_content': '<p>old</p>'})])
+        self.assertEqual(changed, 0)
+        self.assertIn('<em>new</em>',
+                      Post.objects.get(pk=post.pk).rendered_content)
+
+
+class NeighbourLinkTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        now = timezone.now()
+        self.posts = [
+            Post.objects.create(title='Post %d' % i, slug='post-%d' % i,
+                                content='content', author=self.author,
+                                publish_date=now - timedelta(days=3 - i))
+            for i in range(3)]
+
+    def get(self, post):
+        return Post.objects.select_related(
+            'next_post', 'previous_post').get(pk=post.pk)
+
+    def test_links_need_no_queries(self):
+        first, middle, last = self.posts
+        middle, last = self.get(middle), self.get(last)
+        with self.assertNumQueries(0):
+            self.assertEqual(middle.get_next_post(), last)
+            self.assertEqual(middle.get_previous_post(), first)
+            self.assertEqual(last.get_next_post(), None)
+
+    def test_draft_and_delete_close_the_gap(self):
+        first, middle, last = self.posts
+        middle.draft_mode = True
+        middle.save()
+        self.assertEqual(self.get(first).get_next_post(), last)
+
+        middle.draft_mode = False
+        middle.save()
+        self.assertEqual(self.get(first).get_next_post(), middle)
+
+        middle.delete()
+        self.assertEqual(self.get(last).get_previous_post(), first)
+
+    def test_scheduled_posts_are_hidden(self):
+        future = Post.objects.create(
+            title='Future', slug='future', content='content',
+            author=self.author,
+            publish_date=timezone.now() + timedelta(days=1))
+        last = self.get(self.posts[-1])
+        self.assertEqual(last.next_post, future)
+        self.assertEqual(last.get_next_post(), None)
+
+
+class QueryCountMixin(object):
+    urls = __name__.rsplit('.', 1)[0] + '.urls'
+
+    def count_queries(self, path):
+        # the test client sends request_started, which resets the queries
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        request_started.disconnect(reset_queries)
+        start = len(connection.queries)
+        try:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            return len(connection.queries) - start
+        finally:
+            request_started.connect(reset_queries)
+            connection.use_debug_cursor = use_debug_cursor
+
+
+class ListQueryCountTest(QueryCountMixin, TestCase):
+    """The number of queries a list view makes must not grow with the posts."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.tag = Tag.objects.create(name='code', slug='code')
+        self.year = str(timezone.now().year)
+        self.add_posts(2)
+
+    def add_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            post = Post.objects.create(title='Post %d' % i, slug='post-%d' % i,
+                                       content='content', author=self.author,
+                                       publish_date=timezone.now() - timedelta(minutes=i))
+            post.tags.add(self.tag, Tag.objects.create(name='t%d' % i, slug='t%d' % i))
+
+    def assertConstantQueries(self, path):
+        # warm up process wide caches, such as SITE_CACHE
+        self.client.get(path)
+        before = self.count_queries(path)
+        self.add_posts(4)
+        self.assertEqual(self.count_queries(path), before)
+
+    def test_post_list(self):
+        self.assertConstantQueries('/')
+
+    def test_archive_index(self):
+        self.assertConstantQueries('/archive/')
+
+    def test_year_archive(self):
+        self.assertConstantQueries('/%s/' % self.year)
+
+    def test_tag_list(self):
+        self.assertConstantQueries('/tags/code/')
+
+    def test_feed(self):
+        self.assertConstantQueries('/rss/')
+
+
+class TagListCacheTest(TestCase):
+    def setUp(self):
+        invalidate_tag_list()
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.tag = Tag.objects.create(name='code', slug='code')
+        self.post = Post.objects.create(title='Tagged', slug='tagged',
+                                        content='content', author=self.author)
+        self.post.tags.add(self.tag)
+
+    def test_unused_list_costs_nothing(self):
+        with self.assertNumQueries(0):
+            LazyTagList()
+
+    def test_cached_until_changed(self):
+        tags = list(LazyTagList())
+        self.assertEqual([(t.name, t.post_count) for t in tags], [('code', 1)])
+        with self.assertNumQueries(0):
+            list(LazyTagList())
+
+        self.post.draft_mode = True
+        self.post.save()
+        self.assertEqual(list(LazyTagList()), [])
+
+
+class TagCountTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.tag = Tag.objects.create(name='code', slug='code')
+        self.post = Post.objects.create(title='Tagged', slug='tagged',
+                                        content='content', author=self.author)
+
+    def count(self):
+        return Tag.objects.get(pk=self.tag.pk).active_post_count
+
+    def test_counts_follow_tags_and_drafts(self):
+        self.post.tags.add(self.tag)
+        self.assertEqual(self.count(), 1)
+        self.post.draft_mode = True
+        self.post.save()
+        self.assertEqual(self.count(), 0)
+        self.post.draft_mode = False
+        self.post.save()
+        self.assertEqual(self.count(), 1)
+        self.post.tags.clear()
+        self.assertEqual(self.count(), 0)
+
+    def test_reconcile_counts_scheduled_posts(self):
+        self.post.publish_date = timezone.now() + timedelta(days=1)
+        self.post.save()
+        self.post.tags.add(self.tag)
+        self.assertEqual(self.count(), 0)
+        Post.objects.filter(pk=self.post.pk).update(
+            publish_date=timezone.now() - timedelta(days=1))
+        self.assertEqual(Tag.objects.reconcile(), 1)
+        self.assertEqual(self.count(), 1)
+
+
+class ArchiveMonthTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.post = Post.objects.create(
+            title='Dated', slug='dated', content='content', author=self.author,
+            publish_date=datetime(2012, 3, 14, 12, tzinfo=timezone.utc))
+
+    def months(self):
+        return list(ArchiveMonth.objects.values_list(
+            'year', 'month', 'post_count'))
+
+    def test_counts_follow_saves_and_deletes(self):
+        self.assertEqual(self.months(), [(2012, 3, 1)])
+        self.post.draft_mode = True
+        self.post.save()
+        self.assertEqual(self.months(), [])
+        self.post.draft_mode = False
+        self.post.save()
+        self.post.publish_date = datetime(2011, 7, 1, 12, tzinfo=timezone.utc)
+        self.post.save()
+        self.assertEqual(self.months(), [(2011, 7, 1)])
+        self.post.delete()
+        self.assertEqual(self.months(), [])
+
+    def test_reconcile_counts_scheduled_posts(self):
+        Post.objects.create(title='Later', slug='later', content='content',
+                            author=self.author,
+                            publish_date=timezone.now() + timedelta(days=40))
+        self.assertEqual(len(self.months()), 1)
+        Post.objects.filter(slug='later').update(
+            publish_date=datetime(2012, 3, 1, tzinfo=timezone.utc))
+        self.assertEqual(ArchiveMonth.objects.reconcile(), 1)
+        self.assertEqual(self.months(), [(2012, 3, 2)])
+        self.assertEqual(ArchiveMonth.objects.reconcile(), 0)
+
+    def test_year_view_uses_summary(self):
+        response = self.client.get('/2012/')
+        self.assertEqual([d.month for d in response.context['date_list']], [3])
+        self.assertContains(response, self.post.get_absolute_url())
+        self.assertEqual(self.client.get('/2010/').status_code, 404)
+
+
+class TagListViewTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.tag = Tag.objects.create(name='Web Dev')
+        for i in range(12):
+            post = Post.objects.create(title='Post %d' % i, slug='post-%d' % i,
+                                       content='content', author=self.author)
+            post.tags.add(self.tag)
+
+    def test_slug_is_filled_in(self):
+        self.assertEqual(self.tag.slug, 'web-dev')
+        self.assertEqual(Tag.objects.create(name='Web  dev').slug, 'web-dev-2')
+        self.assertEqual(self.tag.get_absolute_url(), '/tags/web-dev/')
+
+    def test_paginated_by_slug(self):
+        response = self.client.get('/tags/web-dev/')
+        self.assertEqual(response.context['num_posts'], 12)
+        self.assertEqual(len(response.context['object_list']), 10)
+        response = self.client.get('/tags/web-dev/2/')
+        self.assertEqual(len(response.context['object_list']), 2)
+        self.assertEqual(self.client.get('/tags/Web Dev/').status_code, 404)
+
+    def test_tag_feed_by_slug(self):
+        self.assertContains(self.client.get('/tags/web-dev/rss/'), '<item>',
+                            count=10)
+
+
+class EventBatchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.tag = Tag.objects.create(name='code', slug='code')
+        self.seen = []
+        events.subscribe('test', self.seen.append)
+
+    def tearDown(self):
+        events.unsubscribe('test', self.seen.append)
+
+    def test_events_wait_for_the_batch(self):
+        generation = get_generations(['list'])
+        with events.batch():
+            for i in range(3):
+                post = Post.objects.create(title='Batched %d' % i,
+                                           slug='batched-%d' % i,
+                                           content='content', author=self.author)
+                post.tags.add(self.tag)
+            self.assertEqual(Tag.objects.get(pk=self.tag.pk).active_post_count, 0)
+            self.assertFalse(SearchEntry.objects.exists())
+            self.assertEqual(get_generations(['list']), generation)
+
+        self.assertEqual(Tag.objects.get(pk=self.tag.pk).active_post_count, 3)
+        self.assertEqual(ArchiveMonth.objects.get().post_count, 3)
+        self.assertEqual(len(search.matching('batched')), 3)
+        self.assertNotEqual(get_generations(['list']), generation)
+
+    def test_keys_are_merged(self):
+        with events.batch():
+            events.emit('test', 1, 2)
+            with events.batch():
+                events.emit('test', 2, 3)
+            self.assertEqual(self.seen, [])
+        self.assertEqual(self.seen, [set([1, 2, 3])])
+        events.emit('test', 4)
+        self.assertEqual(self.seen, [set([1, 2, 3]), set([4])])
+
+    def test_failed_batch_drops_its_events(self):
+        with self.assertRaises(ValueError):
+            with events.batch():
+                events.emit('test', 1)
+                raise ValueError
+        events.emit('test', 2)
+        self.assertEqual(self.seen, [set([2])])
+
+
+@override_settings(GINYU_PAGE_CACHE=True)
+class PageCacheTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.post = Post.objects.create(title='Cached', slug='cached',
+                                        content='content', author=self.author)
+        self.detail = self.post.get_absolute_url()
+
+    def test_pages_are_cached_until_edited(self):
+        self.count_queries('/')
+        self.count_queries(self.detail)
+        # only the conditional GET validators are queried
+        self.assertEqual(self.count_queries('/'), 1)
+        self.assertEqual(self.count_queries(self.detail), 1)
+
+        self.post.title = 'Edited'
+        self.post.save()
+        self.assertContains(self.client.get('/'), 'Edited')
+        self.assertContains(self.client.get(self.detail), 'Edited')
+
+    def test_new_post_invalidates_neighbour(self):
+        self.count_queries(self.detail)
+        Post.objects.create(title='Newer', slug='newer', content='content',
+                            author=self.author)
+        self.assertContains(self.client.get(self.detail), 'Newer')
+
+
+class ConditionalGetTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.post = Post.objects.create(title='Valid', slug='valid',
+                                        content='content', author=self.author)
+
+    def assertNotModified(self, path):
+        response = self.client.get(path)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_views_answer_304(self):
+        for path in ('/', '/rss/', '/archive/', self.post.get_absolute_url()):
+            self.assertNotModified(path)
+
+    def test_edit_changes_etag(self):
+        etag = self.assertNotModified('/rss/')
+        self.post.title = 'Edited'
+        self.post.save()
+        response = self.client.get('/rss/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(GINYU_ACTIVE_BUCKET=60)
+class ActiveBucketTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.start = active_now() + timedelta(minutes=5)
+        self.post = Post.objects.create(
+            title='Scheduled', slug='scheduled', content='content',
+            author=self.author, publish_date=self.start + timedelta(seconds=30))
+
+    def test_publish_date_default_is_evaluated_per_object(self):
+        for model in (Post, Page):
+            field = model._meta.get_field('publish_date')
+            self.assertEqual(field.default, timezone.now)
+
+    def test_now_is_floored_to_the_bucket(self):
+        self.assertEqual(active_now(now=self.start + timedelta(seconds=59)),
+                         self.start)
+        self.assertEqual(active_now(bucket=0, now=self.start + timedelta(seconds=1)),
+                         self.start + timedelta(seconds=1))
+
+    def test_scheduled_post_goes_live_at_the_next_boundary(self):
+        def live(seconds):
+            now = self.start + timedelta(seconds=seconds)
+            return Post.objects.active(now=now).filter(pk=self.post.pk).exists()
+        self.assertFalse(live(29))
+        # past its publish_date but still inside the same bucket
+        self.assertFalse(live(59))
+        self.assertTrue(live(60))
+
+    def test_cached_within_bucket_until_invalidated(self):
+        count = lambda: Post.objects.active().count()
+        self.assertEqual(cached_active('count', ['list'], count), 0)
+        Post.objects.filter(pk=self.post.pk).update(
+            publish_date=timezone.now() - timedelta(minutes=5))
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_active('count', ['list'], count), 0)
+        self.post = Post.objects.get(pk=self.post.pk)
+        self.post.save()
+        self.assertEqual(cached_active('count', ['list'], count), 1)
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        date = timezone.now() - timedelta(days=1)
+        # two posts share a publish_date to exercise the id tie-breaker
+        self.posts = [
+            Post.objects.create(title='Post %d' % i, slug='post-%d' % i,
+                                content='content', author=self.author,
+                                publish_date=date - timedelta(hours=i // 2))
+            for i in range(5)]
+        self.paginator = KeysetPaginator(Post.objects.active(), 2)
+
+    def test_pages_walk_forward_and_back(self):
+        with self.assertNumQueries(1):
+            first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+        third = self.paginator.page(after=second.next_cursor)
+        seen = list(first) + list(second) + list(third)
+        self.assertEqual(sorted(p.pk for p in seen),
+                         sorted(p.pk for p in self.posts))
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+
+class SearchTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+
+    def create(self, title, content, **kwargs):
+        return Post.objects.create(title=title, slug=title.lower(),
+                                   content=content, author=self.author,
+                                   **kwargs)
+
+    def found(self, query, **kwargs):
+        return [(r['kind'], r['object_id'])
+                for r in search.matching(query, **kwargs)]
+
+    def test_stemming(self):
+        self.assertEqual(set(search.terms('Rendering rendered renders')),
+                         set(['render']))
+        self.assertEqual(search.terms('the cache is caching'),
+                         ['cach', 'cach'])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.create('Skate', 'Kickflips on a board.')
+        self.assertEqual(self.found('kickflip'), [('post', post.pk)])
+
+        # the description was filled in from the old content
+        post.content = post.description = 'Grinding rails instead.'
+        post.save()
+        self.assertEqual(self.found('kickflip'), [])
+        self.assertEqual(self.found('grind rails'), [('post', post.pk)])
+
+        post.delete()
+        self.assertFalse(SearchEntry.objects.filter(object_id=post.pk).exists())
+
+    def test_unchanged_save_keeps_the_index(self):
+        post = self.create('Skate', 'Kickflips on a board.')
+        post = Post.objects.get(pk=post.pk)
+        with self.assertNumQueries(0):
+            search.index_saved(Post, post)
+
+    def test_ranking_and_drafts(self):
+        mention = self.create('Music', 'Some words and then a ninja.')
+        title = self.create('Ninja', 'All about the ninja.')
+        draft = self.create('Ninja draft', 'ninja', draft_mode=True)
+        self.assertEqual(self.found('ninjas'),
+                         [('post', title.pk), ('post', mention.pk)])
+        # the admin searches drafts too
+        admin = search.filter_queryset(Post.objects.all(), 'ninja')
+        self.assertEqual(set(admin), set([mention, title, draft]))
+
+    def test_search_view(self):
+        self.create('Ninja', 'A code mangling skate ninja.')
+        response = self.client.get('/search/', {'q': 'NINJA'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['results']), 1)
+        self.assertContains(response, '<mark>ninja.</mark>')
+
+
+class FeedTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.tag = Tag.objects.create(name='code', slug='code')
+        self.posts = [
+            Post.objects.create(title='Post %d' % i, slug='post-%d' % i,
+                                content='content', author=self.author,
+                                publish_date=timezone.now() - timedelta(hours=i))
+            for i in range(5)]
+        self.posts[0].tags.add(self.tag)
+
+    def test_formats_share_the_cached_items(self):
+        response = self.client.get('/rss/')
+        self.assertEqual(response['Content-Type'],
+                         'application/rss+xml; charset=utf-8')
+        # only the validators are queried, the items come from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get('/atom/')
+        self.assertContains(response, '<entry>', count=5)
+        with self.assertNumQueries(1):
+            response = self.client.get('/feed.json')
+        self.assertEqual(len(json.loads(response.content.decode())['items']), 5)
+
+    def test_edit_refreshes_items(self):
+        self.client.get('/rss/')
+        self.posts[1].title = 'Edited'
+        self.posts[1].save()
+        self.assertContains(self.client.get('/rss/'), 'Edited')
+
+    def test_feed_size(self):
+        with self.settings(GINYU_FEED_SIZE=2):
+            invalidate_pages('feed')
+            self.assertContains(self.client.get('/rss/'), '<item>', count=2)
+
+    def test_tag_feed(self):
+        response = self.client.get('/tags/code/rss/')
+        self.assertContains(response, '<item>', count=1)
+        self.assertContains(response, 'Post 0')
+
+    def test_archive_streams_every_post_in_chunks(self):
+        chunk_size = ArchiveFeed.chunk_size
+        ArchiveFeed.chunk_size = 2
+        try:
+            response = self.client.get('/archive/rss/')
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        finally:
+            ArchiveFeed.chunk_size = chunk_size
+        self.assertEqual(content.count('<item>'), 5)
+        self.assertTrue(content.endswith('</rss>'))
+
+
+class ExportTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.post = Post.objects.create(title='Exported', slug='exported',
+                                        content='content', author=self.author)
+        self.output = tempfile.mkdtemp()
+
+    def export(self):
+        call_command('ginyu_export', output=self.output, workers=1,
+                     base_url='https://blog.example.com', verbosity=0)
+
+    def read(self, name):
+        with open(os.path.join(self.output, name)) as f:
+            return f.read()
+
+    def test_export_and_static_fingerprints(self):
+        self.export()
+        index = self.read('index.html')
+        self.assertIn('Exported', index)
+        self.assertTrue(re.search(r'/static/css/style\.[0-9a-f]{12}\.css', index))
+        self.assertIn('<rss', self.read('rss/index.xml'))
+        detail = self.post.get_absolute_url().lstrip('/') + 'index.html'
+        self.assertIn('content', self.read(detail))
+        # absolute urls use the site's host, or that of the Site object
+        for name in ('sitemap.xml', 'rss/index.xml'):
+            self.assertNotIn('testserver', self.read(name))
+
+    def test_only_changed_pages_are_written(self):
+        page = Page.objects.create(title='About', slug='about',
+                                   content='about', author=self.author)
+        self.export()
+        detail = self.post.get_absolute_url().lstrip('/') + 'index.html'
+        for name in ('about/index.html', detail):
+            with open(os.path.join(self.output, name), 'w') as f:
+                f.write('stale')
+
+        self.post.content = 'edited'
+        self.post.save()
+        self.export()
+        self.assertIn('edited', self.read(detail))
+        self.assertEqual(self.read('about/index.html'), 'stale')
+
+
+@override_settings(GINYU_PAGE_CACHE=True, GINYU_SITEMAP_SIZE=2)
+class SitemapTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com')
+        self.posts = [
+            Post.objects.create(title='Post %d' % i, slug='post-%d' % i,
+                                content='content', author=self.author,
+                                publish_date=timezone.now() - timedelta(hours=i))
+            for i in range(5)]
+
+    def chunk_url(self, post):
+        return '/sitemap-posts-%d.xml' % (post.pk // 2)
+
+    def test_index_lists_chunks(self):
+        response = self.client.get('/sitemap.xml')
+        for post in self.posts:
+            self.assertContains(response, self.chunk_url(post))
+
+        first = self.posts[0]
+        response = self.client.get(self.chunk_url(first))
+        for post in self.posts:
+            if post.pk // 2 == first.pk // 2:
+                self.assertContains(response, post.get_absolute_url())
+            else:
+                self.assertNotContains(response, post.get_absolute_url())
+
+    def test_edit_regenerates_only_its_chunk(self):
+        first, last = self.posts[0], self.posts[-1]
+        self.count_queries(self.chunk_url(first))
+        self.count_queries(self.chunk_url(last))
+
+        first.title = 'Edited'
+        first.save()
+        self.assertEqual(self.count_queries(self.chunk_url(last)), 0)
+        self.assertNotEqual(self.count_queries(self.chunk_url(first)), 0)
+
+
+@override_settings(
+    GINYU_PAGE_CACHE=True, INTERNAL_IPS=(),
+    MIDDLEWARE_CLASSES=tuple(settings.MIDDLEWARE_CLASSES) + (
+        __name__.rsplit('.', 1)[0] + '.metrics.MetricsMiddleware',))
+class MetricsTest(QueryCountMixin, TestCase):
+    def setUp(self):
+        aggregate.clear()
+        self.author = User.objects.create_user('ginyu', 'ginyu@example.com',
+                                               'secret')
+        self.post = Post.objects.create(title='Timed', slug='timed',
+                                        content='Some *markup*.',
+                                        author=self.author)
+
+    def test_server_timing(self):
+        timing = self.client.get(self.post.get_absolute_url())['Server-Timing']
+        self.assertTrue(re.search(r'db;dur=[\d.]+;desc="\d+ call', timing))
+        self.assertIn('template;dur=', timing)
+        self.assertIn('cache-page;desc="0 hit(s), 1 miss(es)"', timing)
+
+        timing = self.client.get(self.post.get_absolute_url())['Server-Timing']
+        self.assertIn('cache-page;desc="1 hit(s), 0 miss(es)"', timing)
+        self.assertNotIn('template;', timing)
+        self.assertEqual(aggregate.snapshot()['PostDetailView']['requests'], 2)
+
+    def test_metrics_view(self):
+        self.client.get('/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+        self.author.is_staff = True
+        self.author.save()
+        self.client.login(username='ginyu', password='secret')
+        response = self.client.get('/metrics/')
+        self.assertContains(response,
+                            'ginyu_requests_total{view="PostListView"} 1')
+        self.assertContains(response, 'ginyu_cache_misses_total{'
+                            'view="PostListView",cache="page"} 1')
+
+    def test_feeds_are_told_apart(self):
+        for path in ('/rss/', '/atom/', '/feed.json'):
+            self.client.get(path)
+        views = aggregate.snapshot()
+        for name in ('LastestPostsFeed', 'LatestPostsAtomFeed',
+                     'LatestPostsJSONFeed'):
+            self.assertEqual(views[name]['requests'], 1)
+
+
+urlpatterns = patterns('', url(r'^admin/', include(admin.site.urls)))
+
+
+class AdminChangeListTest(TestCase):
+    urls = __name__
+
+    def setUp(self):
+        self.author = User.objects.create_superuser('ginyu', 'ginyu@example.com',
+                                                    'secret')
+        self.post = Post.objects.create(title='Listed', slug='listed',
+                                        content='Some *markup*.',
+                                        author=self.author)
+        self.client.login(username='ginyu', password='secret')
+
+    def test_rows_leave_out_the_text_columns(self):
+        response = self.client.get('/admin/ginyu/post/')
+        row = response.context['cl'].result_list[0]
+        self.assertEqual(row.title, 'Listed')
+        self.assertNotIn('content', row.__dict__)
+        self.assertNotIn('rendered_content', row.__dict__)
+
+    def test_author_filter_is_cached(self):
+        self.assertEqual(cached_authors(Post), [(self.author.pk, 'ginyu')])
+        with self.assertNumQueries(0):
+            cached_authors(Post)
+        response = self.client.get('/admin/ginyu/post/?author=%d' % self.author.pk)
+        self.assertEqual([p.pk for p in response.context['cl'].result_list],
+                         [self.post.pk])
+
+    def test_draft_toggle_renders_nothing(self):
+        render_cache.clear()
+        response = self.client.post('/admin/ginyu/post/', {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+            'form-MAX_NUM_FORMS': '', 'form-0-id': str(self.post.pk),
+            'form-0-draft_mode': 'on', '_save': 'Save'})
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertTrue(post.draft_mode)
+        self.assertEqual(post.rendered_content, self.post.rendered_content)
+        self.assertEqual(sum(render_cache.stats.values()), 0)
+
+    def test_draft_toggle_only_writes_the_toggle(self):
+        User.objects.create_superuser('editor', 'editor@example.com', 'secret')
+        self.client.login(username='editor', password='secret')
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        request_started.disconnect(reset_queries)
+        start = len(connection.queries)
+        try:
+            response = self.client.post('/admin/ginyu/post/', {
+                'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+                'form-MAX_NUM_FORMS': '', 'form-0-id': str(self.post.pk),
+                'form-0-draft_mode': 'on', '_save': 'Save'})
+            updates = [q['sql'] for q in connection.queries[start:]
+                       if q['sql'].startswith('UPDATE "ginyu_post"')]
+        finally:
+            request_started.connect(reset_queries)
+            connection.use_debug_cursor = use_debug_cursor
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).author, self.author)
+        self.assertEqual(len(updates), 1)
+        columns = re.findall(r'"(\w+)" = ', updates[0].split(' WHERE ')[0])
+        self.assertEqual(set(columns), set(['draft_mode', 'modified']))
+
+
+class BulkActionTest(TestCase):
+    urls = __name__
+
+    def setUp(self):
+        self.author = User.objects.create_superuser('ginyu', 'ginyu@example.com',
+                                                    'secret')
+        self.tag = Tag.objects.create(name='code', slug='code')
+        self.posts = []
+        for i in range(3):
+            post = Post.objects.create(
+                title='Post %d' % i, slug='post-%d' % i, content='content',
+                author=self.author,
+                publish_date=datetime(2012, 3, 10 - i, tzinfo=timezone.utc))
+            post.tags.add(self.tag)
+            self.posts.append(post)
+        self.pks = [p.pk for p in self.posts]
+        self.client.login(username='ginyu', password='secret')
+
+    def get(self, post):
+        return Post.objects.get(pk=post.pk)
+
+    def test_invalidates_once(self):
+        flushes = []
+        events.subscribe('pages', flushes.append)
+        try:
+            self.assertEqual(Post.objects.make_draft(self.pks[:2]), 2)
+        finally:
+            events.unsubscribe('pages', flushes.append)
+        self.assertEqual(len(flushes), 1)
+
+        last = self.get(self.posts[2])
+        self.assertEqual((last.previous_post, last.next_post), (None, None))
+        self.assertEqual(Tag.objects.get(pk=self.tag.pk).active_post_count, 1)
+        self.assertEqual(ArchiveMonth.objects.get().post_count, 1)
+
+        self.assertEqual(Post.objects.publish_now(self.pks), 2)
+        self.assertEqual(self.get(self.posts[1]).next_post, self.posts[0])
+        self.assertEqual(Tag.objects.get(pk=self.tag.pk).active_post_count, 3)
+
+    def test_shift_publish_date_action(self):
+        data = {'action': 'shift_publish_date',
+                helpers.ACTION_CHECKBOX_NAME: [self.pks[0]]}
+        response = self.client.post('/admin/ginyu/post/', data)
+        self.assertContains(response, 'Shift the publish date')
+
+        data.update({'apply': 'yes', 'days': '-365', 'hours': '0'})
+        response = self.client.post('/admin/ginyu/post/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get(self.posts[0]).publish_date.year, 2011)
+        self.assertEqual(sorted(ArchiveMonth.objects.values_list(
+            'year', 'month', 'post_count')), [(2011, 3, 1), (2012, 3, 2)])
+        self.assertEqual(self.get(self.posts[0]).previous_post, None)
+
+    def test_tag_in_bulk(self):
+        music = Tag.objects.create(name='music', slug='music')
+        self.assertEqual(Post.objects.tag_in_bulk(self.pks, music), 3)
+        self.assertEqual(Post.objects.tag_in_bulk(self.pks, music), 0)
+        self.assertEqual(Tag.objects.get(pk=music.pk).active_post_count, 3)
+        self.assertEqual(Post.objects.tag_in_bulk(self.pks[:1], self.tag,
+                                                  remove=True), 1)
+        self.assertEqual(Tag.objects.get(pk=self.tag.pk).active_post_count, 2)
+        self.assertEqual(list(self.get(self.posts[0]).tags.all()), [music])
@@ -1,7 +1,21 @@
 from django.conf.urls import patterns, url
-from .feeds import LastestPostsFeed
+from .caching import cache_page_groups, conditional
+from .metrics import metrics
+from .sitemaps import sitemap, sitemap_index
+from .feeds import (ArchiveAtomFeed, ArchiveFeed, LastestPostsFeed,
+                    LatestPostsAtomFeed, LatestPostsJSONFeed, TagPostsAtomFeed,
+                    TagPostsFeed, TagPostsJSONFeed)
 from .views import *
 
+
+def feed_view(feed, validators, groups):
+    view = conditional(validators)(cache_page_groups(groups)(feed))
+    # Feed instances have no __name__, name the view after their class
+    # for the metrics
+    view.__name__ = type(feed).__name__
+    return view
+
+
 urlpatterns = patterns('sawboo.ginyu.views',
 
     # Post detail views
@@ -15,13 +29,48 @@ urlpatterns = patterns('sawboo.ginyu.views',
     url(r'(?P<year>\d{4})/$', PostYearArchiveView.as_view(),
         name="yearly"),
 
-    # RSS feed
-    url(r'^rss/', LastestPostsFeed()),
+    # Feeds
+    url(r'^rss/', feed_view(LastestPostsFeed(), active_validators, ['feed'])),
+
+    url(r'^atom/$', feed_view(LatestPostsAtomFeed(), active_validators,
+                              ['feed'])),
+
+    url(r'^feed\.json$', feed_view(LatestPostsJSONFeed(), active_validators,
+                                   ['feed'])),
+
+    url(r'^archive/rss/$', conditional(active_validators)(ArchiveFeed())),
+
+    url(r'^archive/atom/$', conditional(active_validators)(ArchiveAtomFeed())),
+
+    url(r'^tags/(?P<slug>[-\w]+)/rss/$', feed_view(
+        TagPostsFeed(), tag_validators, ['feed', 'tag:%(slug)s'])),
+
+    url(r'^tags/(?P<slug>[-\w]+)/atom/$', feed_view(
+        TagPostsAtomFeed(), tag_validators, ['feed', 'tag:%(slug)s'])),
+
+    url(r'^tags/(?P<slug>[-\w]+)/feed\.json$', feed_view(
+        TagPostsJSONFeed(), tag_validators, ['feed', 'tag:%(slug)s'])),
+
+    # Sitemaps
+    url(r'^sitemap\.xml$', sitemap_index, name='ginyu_sitemap_index'),
+
+    url(r'^sitemap-(?P<section>posts|pages|tags)-(?P<chunk>0|[1-9]\d*)\.xml$',
+        sitemap, name='ginyu_sitemap'),
+
+    # Metrics
+    url(r'^metrics/$', metrics, name='ginyu_metrics'),
+
+    # Search
+    url(r'^search/$', SearchView.as_view(), name='SearchView'),
 
     # Tag views
     url(r'^tags/all/$', TagListAll.as_view(), name='TagListAll'),
 
-    url(r'^tags/(?P<tag>[-\w]+)/?$', 'TagListView', name='TagListView'),
+    url(r'^tags/(?P<slug>[-\w]+)/$', TagListView.as_view(),
+        name='TagListView'),
+
+    url(r'^tags/(?P<slug>[-\w]+)/(?P<page>[0-9]+)/$', TagListView.as_view(),
+        name='TagListView'),
 
     # Page view
     url(r'^(?P<slug>[-_\w]+)/$', PageDetailView.as_view(),
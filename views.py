@@ -1,10 +1,14 @@
 from django.views.generic import ListView, DetailView, ArchiveIndexView
 from django.views.generic.dates import YearArchiveView
-from django.db.models import Count
-from django.template import RequestContext
-from django.shortcuts import get_object_or_404, render_to_response
-from django.db.models import Count
-from .models import Post, Tag, Page
+from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.conf import settings
+from django.utils.http import urlencode
+from .caching import (cached_active, cached_count, cached_response,
+                      conditional, make_validators, queryset_validators)
+from .models import ArchiveMonth, Post, Tag, Page, active_now
+from .paginators import CachedCountPaginator, KeysetPaginator
+from . import search
 
 # Goodbye function based views, hello class based views.
 # For more information on the magic going on here see the docs:
@@ -12,58 +16,249 @@ from .models import Post, Tag, Page
 # https//docs.djangoproject.com/en/1.5/ref/class-based-views/
 
 
-class PostListView(ListView):
+class ConditionalMixin(object):
+    """
+    Answers conditional GETs with a 304 using the validators returned by
+    `get_validators`, before the view loads or renders anything.
+
+    """
+    def get_validators(self, request, *args, **kwargs):
+        return None, None
+
+    def dispatch(self, request, *args, **kwargs):
+        parent = super(ConditionalMixin, self).dispatch
+        view = conditional(self.get_validators)(
+            lambda request, *args, **kwargs: parent(request, *args, **kwargs))
+        return view(request, *args, **kwargs)
+
+
+def active_validators(request, *args, **kwargs):
+    """Validators for views that list every active post."""
+    return cached_active('validators', ['list'], lambda: queryset_validators(
+        Post.objects.active()))
+
+
+class CachedPageMixin(object):
+    """
+    Serves responses from the Ginyu page cache. `cache_groups` are
+    filled in with the url keyword arguments, see `caching`.
+
+    """
+    cache_groups = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        parent = super(CachedPageMixin, self).dispatch
+        groups = [g % kwargs for g in self.cache_groups]
+        return cached_response(request, groups,
+                               lambda: parent(request, *args, **kwargs))
+
+
+class PostPaginationMixin(object):
+    """
+    Paginates posts with a cached count. Requests with an `after` or
+    `before` cursor are paginated by keyset instead, as is the first page
+    when GINYU_KEYSET_PAGINATION is set. Page numbers keep working.
+
+    """
+    paginator_class = CachedCountPaginator
+
+    def get_paginator(self, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator_class(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            count_group=self.cache_groups[0] % self.kwargs)
+
+    def use_keyset(self):
+        params = self.request.GET
+        if 'after' in params or 'before' in params:
+            return True
+        return (getattr(settings, 'GINYU_KEYSET_PAGINATION', False) and
+                'page' not in params and 'page' not in self.kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset():
+            return super(PostPaginationMixin, self).paginate_queryset(
+                queryset, page_size)
+        page = KeysetPaginator(queryset, page_size).page(
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'))
+        return page.paginator, page, page.object_list, page.has_other_pages()
+
+
+class PostListView(ConditionalMixin, CachedPageMixin, PostPaginationMixin,
+        ListView):
     """A view that returns a list of posts objects."""
     model = Post
-    queryset = Post.objects.active()
+    cache_groups = ('list',)
     template_name = "post_list.html"
     paginate_by = 10
 
-class TagListAll(ListView):
+    def get_queryset(self):
+        return Post.objects.listing(tags=True)
+
+    def get_validators(self, request, *args, **kwargs):
+        return active_validators(request)
+
+class TagListAll(CachedPageMixin, ListView):
     """A view that returns a list of tag objects."""
     model = Tag
-    queryset = Tag.objects.all().annotate(Count('post'))
+    cache_groups = ('tags',)
+    queryset = Tag.objects.all()
     template_name = "all_tags.html"
     paginate_by = 10
 
-def TagListView(request, tag):
+def tag_validators(request, slug, **kwargs):
+    return cached_active('validators', ['tag:%s' % slug], lambda: queryset_validators(
+        Post.objects.active().filter(tags__slug=slug)))
+
+
+class TagListView(ConditionalMixin, CachedPageMixin, PostPaginationMixin,
+        ListView):
     """A view that returns a list of posts objects with a given tag."""
-    t = get_object_or_404(Tag, name=tag)
-    posts = Post.objects.active().filter(tags__name=tag)
-    return render_to_response(
-        'tag_list.html', {
-            'object_list': posts,
-            'tag_name': t.name,
-            'num_posts': len(posts), }, context_instance=RequestContext(request))
+    cache_groups = ('tag:%(slug)s',)
+    template_name = "tag_list.html"
+    paginate_by = 10
+
+    def get_queryset(self):
+        self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
+        return Post.objects.listing(tags=True).filter(tags=self.tag)
 
+    def get_validators(self, request, *args, **kwargs):
+        return tag_validators(request, **kwargs)
 
-class PostDetailView(DetailView):
+    def get_context_data(self, **kwargs):
+        context = super(TagListView, self).get_context_data(**kwargs)
+        context.update({
+            'tag': self.tag,
+            'tag_name': self.tag.name,
+            # shares the paginator's cached count
+            'num_posts': cached_count(self.object_list,
+                                      self.cache_groups[0] % self.kwargs),
+        })
+        return context
+
+
+class PostDetailView(ConditionalMixin, CachedPageMixin, DetailView):
     """A view that returns the details of a single post."""
     model = Post
+    cache_groups = ('post:%(year)s/%(slug)s',)
+    queryset = Post.objects.select_related('next_post', 'previous_post')
     date_field = 'publish_date'
     template_name = "post_detail.html"
 
-class PageDetailView(DetailView):
+    def get_validators(self, request, *args, **kwargs):
+        # The footer links to the neighbours, so they are part of the page.
+        rows = Post.objects.filter(slug=kwargs['slug'],
+                                   publish_date__year=kwargs['year'])
+        rows = rows.order_by().values_list(
+            'modified', 'previous_post__modified', 'next_post__modified',
+            'next_post__publish_date')[:1]
+        if not rows:
+            return None, None
+        modified, previous, following, next_date = rows[0]
+        if next_date is not None and next_date > active_now():
+            following = next_date = None
+        return make_validators(modified, previous, following, next_date)
+
+class PageDetailView(ConditionalMixin, CachedPageMixin, DetailView):
     """A view that returns the details of a single page."""
     model = Page
-    date_field = 'publish_date'
-    template_name = "Page_detail.html"
+    cache_groups = ('page:%(slug)s',)
+    template_name = "page_detail.html"
+
+    def get_validators(self, request, *args, **kwargs):
+        rows = Page.objects.filter(slug=kwargs['slug']).order_by().values_list(
+            'modified')[:1]
+        return make_validators(*rows[0]) if rows else (None, None)
+
+
+class ArchiveSummaryMixin(object):
+    """
+    Takes the date lists and the next/previous years of date based views
+    from ArchiveMonth instead of aggregating the posts. An archive
+    without dates is a 404, as with `allow_empty = False`.
+
+    """
+    # get_queryset() only returns active posts and get_date_list() does
+    # the empty check, so neither needs a query of its own.
+    allow_empty = True
+    allow_future = True
+
+    def get_date_list(self, queryset, date_type=None, ordering='ASC'):
+        date_list = ArchiveMonth.objects.date_list(
+            date_type or self.get_date_list_period(),
+            year=self.kwargs.get('year'), ordering=ordering)
+        if not date_list:
+            raise Http404('No posts available')
+        return date_list
+
+    def get_next_year(self, date):
+        return ArchiveMonth.objects.adjacent_year(date.year)
+
+    def get_previous_year(self, date):
+        return ArchiveMonth.objects.adjacent_year(date.year, previous=True)
 
+    def get_context_data(self, **kwargs):
+        context = super(ArchiveSummaryMixin, self).get_context_data(**kwargs)
+        context['archive_months'] = ArchiveMonth.objects.all()
+        return context
 
-class PostArchiveIndexView(ArchiveIndexView):
+
+class PostArchiveIndexView(ConditionalMixin, CachedPageMixin, PostPaginationMixin,
+        ArchiveSummaryMixin, ArchiveIndexView):
     """returns a simple list of all post objects"""
     model = Post
-    queryset = Post.objects.active()
+    cache_groups = ('archive',)
     date_field = "publish_date"
     template_name = "post_archive.html"
     paginate_by = 20
 
+    def get_validators(self, request, *args, **kwargs):
+        return active_validators(request)
+
+    def get_queryset(self):
+        return Post.objects.listing()
+
 
-class PostYearArchiveView(YearArchiveView):
+class PostYearArchiveView(ConditionalMixin, CachedPageMixin, PostPaginationMixin,
+        ArchiveSummaryMixin, YearArchiveView):
     """returns a list of post objects published in a given year"""
     model = Post
-    queryset = Post.objects.active()
+    cache_groups = ('year:%(year)s',)
     template_name = 'post_archive_yearly.html'
     date_field = 'publish_date'
     make_object_list = True
     paginate_by = 20
+
+    def get_validators(self, request, *args, **kwargs):
+        year = kwargs['year']
+        return cached_active('validators', ['year:%s' % year], lambda: queryset_validators(
+            Post.objects.active().filter(publish_date__year=year)))
+
+    def get_queryset(self):
+        return Post.objects.listing()
+
+
+class SearchView(CachedPageMixin, ListView):
+    """
+    Returns published posts and pages containing every word of the `q`
+    parameter, best matches first, with highlighted snippets.
+
+    """
+    cache_groups = ('search',)
+    template_name = 'search.html'
+    paginate_by = 10
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.matching(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        context.update({
+            'query': self.query,
+            'results': search.load(context['object_list'], self.query),
+            'page_query': urlencode({'q': self.query}) + '&',
+        })
+        return context